@@ -3,115 +3,38 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import sys
 import json
+import logging
 import threading
-import queue
+from automation_core import AutomationCore
 from config_loader import ConfigLoader
-from adb_utils import AdbUtils
-from step_run import StepRunner
-from exit_condition import ExitConditionChecker
-from image_utils import ImageUtils
+from log_utils import RingBufferHandler, setup_logging
 
-# ---------------------------- 控制台输出重定向 ----------------------------
-class ConsoleRedirector:
-    def __init__(self, text_widget):
+logger = logging.getLogger(__name__)
+
+# ---------------------------- 日志显示 ----------------------------
+class LogView:
+    """定时从有上限的日志缓冲批量取出并一次插入，控件只保留最近 max_lines 行"""
+
+    def __init__(self, text_widget, max_lines=2000, refresh_ms=100):
         self.text_widget = text_widget
-        self.output_queue = queue.Queue()
+        self.max_lines = max_lines
+        self.refresh_ms = refresh_ms
+        self.handler = RingBufferHandler(max_lines)
         self.running = True
 
-    def write(self, text):
-        self.output_queue.put(text)
-    
-    def flush(self):
-        pass
-    
     def update_display(self):
-        while not self.output_queue.empty():
-            text = self.output_queue.get()
-            self.text_widget.insert(tk.END, text)
+        lines, dropped = self.handler.drain()
+        if dropped:
+            lines.insert(0, f"... 日志过多，已跳过 {dropped} 行 ...")
+        if lines:
+            self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+            # 末尾总有一个空行，实际行数为 end-1 的行号
+            excess = int(self.text_widget.index('end-1c').split('.')[0]) - 1 - self.max_lines
+            if excess > 0:
+                self.text_widget.delete('1.0', f'{excess + 1}.0')
             self.text_widget.see(tk.END)
         if self.running:
-            self.text_widget.after(100, self.update_display)
-
-# ---------------------------- 核心自动化逻辑 ----------------------------
-class AutomationCore:
-    def __init__(self, config_path, adb_path, adb_ip, adb_port):
-        self.config = ConfigLoader.load(config_path)
-        ConfigLoader.validate(self.config)
-        self.adb_utils = AdbUtils(adb_path)
-        self.adb_utils.connect_emulator(adb_ip, adb_port)
-        ImageUtils.preload_templates(self.config)
-        self.running = True
-
-    def check_global_monitor(self):
-        monitor_config = self.config.get("global_monitor")
-        if not monitor_config:
-            return False
-        if self.adb_utils.take_screenshot():
-            position = ImageUtils.find_image(
-                'screen.png', 
-                monitor_config["trigger_image"],
-                monitor_config.get("threshold", 0.8)
-            )
-            return position is not None
-        return False
-
-    def run(self):
-        try:
-            step_runner = StepRunner(self.config, self.adb_utils)
-            exit_checker = ExitConditionChecker(self.config, self.adb_utils)
-            loop_count, max_loops = 0, 0
-
-            if self.config['loop'].get('enabled', False):
-                loop_type = self.config['loop'].get('type', 'times')
-                max_loops = float('inf') if loop_type == 'infinite' else self.config['loop'].get('times', 1)
-
-            current_main_step = 0
-            main_loop_steps = step_runner.steps
-            in_sub_loop = False
-
-            while self.running and loop_count < max_loops:
-                if in_sub_loop:
-                    sub_loop_config = self.config["global_monitor"]["target_loop"]
-                    sub_step_runner = StepRunner({"steps": sub_loop_config["steps"]}, self.adb_utils)
-                    sub_loop_exit = False
-
-                    for step in sub_loop_config["steps"]:
-                        success = sub_step_runner.run_step(step)
-                        if not success:
-                            sub_loop_exit = True
-                            break
-
-                    if not sub_loop_exit and self.adb_utils.take_screenshot():
-                        exit_target = sub_loop_config.get("exit_condition", {}).get("target")
-                        exit_threshold = sub_loop_config.get("exit_condition", {}).get("threshold", 0.6)
-                        if exit_target and ImageUtils.find_image('screen.png', exit_target, exit_threshold):
-                            sub_loop_exit = True
-
-                    in_sub_loop = False
-                    current_main_step = 0
-                    step_runner.steps = main_loop_steps
-                    continue
-
-                print(f"\n--- 主循环第 {loop_count+1} 次 ---")
-                current_main_step = 0
-                while current_main_step < len(step_runner.steps) and self.running:
-                    if self.check_global_monitor():
-                        print("检测到全局触发图像，进入子循环")
-                        in_sub_loop = True
-                        break
-                    if exit_checker.check_exit_condition():
-                        print("满足主循环退出条件，终止程序")
-                        return
-                    success = step_runner.run_step(step_runner.steps[current_main_step])
-                    if not success:
-                        return
-                    current_main_step += 1
-                loop_count += 1
-
-            print(f"\n总共完成 {loop_count} 次主循环")
-
-        except Exception as e:
-            print(f"自动化执行失败: {str(e)}")
+            self.text_widget.after(self.refresh_ms, self.update_display)
 
 # ---------------------------- GUI界面 ----------------------------
 class AutomationUI:
@@ -132,11 +55,10 @@ class AutomationUI:
         # 构建UI组件
         self.setup_ui()
         
-        # 配置输出重定向
-        self.console_redirector = ConsoleRedirector(self.console_text)
-        sys.stdout = self.console_redirector
-        sys.stderr = self.console_redirector
-        self.console_redirector.update_display()
+        # 日志输出到界面
+        self.log_view = LogView(self.console_text)
+        setup_logging(handlers=[self.log_view.handler], console=False)
+        self.log_view.update_display()
 
         # 自动加载默认配置
         self.load_default_config()
@@ -257,8 +179,13 @@ class AutomationUI:
             raise RuntimeError(f"更新配置失败: {str(e)}")
 
     def start_script(self):
+        # 按所选配置的 log_level / log_file 等重新配置日志
+        setup_logging(
+            ConfigLoader.load(self.config_path.get()), handlers=[self.log_view.handler], console=False
+        )
         self.worker_thread = threading.Thread(
             target=self.run_automation, 
+            name="automation",
             daemon=True
         )
         self.running = True
@@ -267,14 +194,23 @@ class AutomationUI:
         self.worker_thread.start()
 
     def run_automation(self):
-        self.automation_core = AutomationCore(
-            config_path=self.config_path.get(),
-            adb_path=self.adb_path.get(),
-            adb_ip=self.adb_ip.get(),
-            adb_port=self.adb_port.get()
-        )
-        self.automation_core.run()
-        self.running = False
+        try:
+            self.automation_core = AutomationCore(
+                config_path=self.config_path.get(),
+                adb_path=self.adb_path.get(),
+                adb_ip=self.adb_ip.get(),
+                adb_port=self.adb_port.get()
+            )
+            self.automation_core.run()
+        except Exception as e:
+            # 模板缺失、adb 连接失败等：写入日志窗口，不让工作线程静默退出
+            logger.exception(f"自动化任务异常结束: {str(e)}")
+        finally:
+            self.running = False
+            # tkinter 控件只能在主线程中修改
+            self.root.after(0, self.on_automation_done)
+
+    def on_automation_done(self):
         self.start_btn.config(text="启动")
         self.status_label.config(text="状态: 空闲")
 
@@ -282,7 +218,7 @@ class AutomationUI:
         if self.automation_core:
             self.automation_core.running = False
         self.running = False
-        print("正在停止自动化任务...")
+        logger.info("正在停止自动化任务...")
 
     def show_error(self, message):
         messagebox.showerror("错误", message)
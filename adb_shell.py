@@ -0,0 +1,131 @@
+import os
+import queue
+import subprocess
+import threading
+import uuid
+
+# Windows 下隐藏控制台窗口，其他平台无此标志
+CREATE_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+
+class AdbShellSession:
+    """常驻的 adb shell 进程，命令经 stdin 发送，以结束标记判断命令完成"""
+
+    def __init__(self, adb_path, device_id=None):
+        self.adb_path = adb_path
+        self.device_id = device_id
+        self.proc = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self._marker = f"__NAMA_DONE_{uuid.uuid4().hex[:8]}__"
+        self._seq = 0
+
+    def _start(self):
+        cmd = [self.adb_path]
+        if self.device_id:
+            cmd.extend(['-s', self.device_id])
+        cmd.append('shell')
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            creationflags=CREATE_NO_WINDOW
+        )
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=self._read_output,
+            args=(self.proc, self._lines),
+            daemon=True
+        ).start()
+
+    @staticmethod
+    def _read_output(proc, lines):
+        for line in iter(proc.stdout.readline, b''):
+            lines.put(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+        lines.put(None)  # 进程已退出
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def run(self, command, timeout=10):
+        """
+        在会话中执行命令并等待其完成
+        :return: (退出码, 输出文本)
+        """
+        with self._lock:
+            for attempt in range(2):
+                if not self.is_alive():
+                    self._start()
+                self._seq += 1
+                marker = f"{self._marker}{self._seq}"
+                try:
+                    self.proc.stdin.write(f"{command}; echo {marker} $?\n".encode('utf-8'))
+                    self.proc.stdin.flush()
+                except OSError:
+                    # 会话已断开，重启后重试一次
+                    self.close()
+                    continue
+                return self._wait_for(marker, timeout)
+            raise RuntimeError("adb shell 会话无法启动")
+
+    def _wait_for(self, marker, timeout):
+        output = []
+        while True:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                # 无法确认命令是否完成，丢弃会话避免输出错位
+                self.close()
+                raise TimeoutError(f"adb shell 命令超时 ({timeout}s)")
+            if line is None:
+                self.close()
+                raise RuntimeError("adb shell 会话意外退出")
+            # 命令输出不以换行结尾时标记会接在最后一行输出之后
+            position = line.find(marker)
+            if position >= 0:
+                if position:
+                    output.append(line[:position])
+                code = line[position + len(marker):].strip()
+                return (int(code) if code.lstrip('-').isdigit() else -1), "\n".join(output)
+            output.append(line)
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        if self.proc.poll() is None:
+            self.proc.kill()
+        try:
+            # 回收已结束的进程，避免残留僵尸进程
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        self.proc = None
+
+
+class AdbShellPool:
+    """小型 adb shell 会话池，使截图与点击等命令可以并行执行"""
+
+    def __init__(self, adb_path, device_id=None, size=2):
+        self.adb_path = os.path.normpath(adb_path)
+        self.device_id = device_id
+        self._sessions = [AdbShellSession(self.adb_path, device_id) for _ in range(size)]
+        self._idle = queue.Queue()
+        for session in self._sessions:
+            self._idle.put(session)
+
+    def run(self, command, timeout=10):
+        session = self._idle.get()
+        try:
+            return session.run(command, timeout)
+        finally:
+            self._idle.put(session)
+
+    def close(self):
+        """关闭所有会话，之后再执行命令时会自动重新启动"""
+        for session in self._sessions:
+            session.close()
@@ -1,10 +1,41 @@
+import logging
 import subprocess
 import os
+import time
+from collections import namedtuple
+import cv2
+from frame import Frame
+from adb_shell import AdbShellPool, CREATE_NO_WINDOW
+from metrics import metrics
+from screen_stream import ScreenStream, STREAM_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MODES = ('png', 'raw', 'stream')
+
+# 连续点击结果：实际送达次数、请求次数、耗时（秒）
+BurstResult = namedtuple('BurstResult', ['delivered', 'requested', 'elapsed'])
 
 class AdbUtils:
-    def __init__(self, adb_path, device_id=None):
+    def __init__(self, adb_path, device_id=None, debug_screenshot=None, capture_mode='png', capture_timeout=10):
         self.adb_path = os.path.normpath(adb_path)
         self.device_id = device_id
+        # 调试用：设置文件名后每次截图额外落盘一份
+        self.debug_screenshot = debug_screenshot
+        # png: screencap -p；raw: 读取未压缩的帧缓冲，省去设备端 PNG 编码
+        # stream: 常驻 exec-out 会话循环输出原始帧，后台解码，取帧不再等待一次 adb 往返
+        self.capture_mode = capture_mode
+        # 原始帧头连续无法识别达到 raw_reject_limit 次才改用 PNG，空数据或偶发的截断不计入
+        self.raw_reject_limit = 3
+        self._raw_rejects = 0
+        self.stream = None
+        self._stream_header_size = None
+        # 最近一次点击完成的时刻，截图流只返回此后截取的帧
+        self._tapped_at = 0.0
+        # 单次截图的最长耗时(秒)，模拟器卡住时结束进程按截图失败处理
+        self.capture_timeout = capture_timeout
+        # 点击等 shell 命令走常驻会话池；截图仍用 exec-out 以保证二进制数据完整
+        self.shell_pool = AdbShellPool(self.adb_path, device_id)
 
     def connect_emulator(self, ip=None, port=None):
         if ip is None:
@@ -17,40 +48,155 @@ class AdbUtils:
         cmd.extend(['connect', f"{ip}:{port}"])
         subprocess.call(cmd)
 
-    def take_screenshot(self, filename='screen.png'):
+    def take_screenshot(self):
+        """截图并在内存中解码，返回灰度 Frame，失败返回 None"""
         try:
+            if self.capture_mode == 'stream':
+                with metrics.timer('capture_seconds', mode='stream'):
+                    frame = self._stream_frame()
+                if frame is not None:
+                    if self.debug_screenshot:
+                        cv2.imwrite(self.debug_screenshot, frame.image)
+                    return frame
+                if self.capture_mode == 'stream':
+                    metrics.incr('capture_failures')
+                    logger.warning("截图失败: 截图流没有新的画面")
+                    return None
+
+            if self.capture_mode == 'raw':
+                with metrics.timer('capture_seconds', mode='raw'):
+                    screenshot_data = self._screencap(raw=True)
+                with metrics.timer('decode_seconds', mode='raw'):
+                    frame = Frame.from_raw(screenshot_data)
+                if frame is None:
+                    if not screenshot_data:
+                        metrics.incr('capture_failures')
+                        logger.warning("截图失败: 没有读到截图数据")
+                        return None
+                    # 头部无法识别（格式/尺寸不符）：本次改用 PNG 截图，连续多次后此设备不再尝试原始帧
+                    self._reject_raw_header()
+                else:
+                    self._raw_rejects = 0
+                    if self.debug_screenshot:
+                        cv2.imwrite(self.debug_screenshot, frame.image)
+                    return frame
+
+            with metrics.timer('capture_seconds', mode='png'):
+                screenshot_data = self._screencap(raw=False)
+            if self.debug_screenshot:
+                with open(self.debug_screenshot, 'wb') as f:
+                    f.write(screenshot_data)
+
+            with metrics.timer('decode_seconds', mode='png'):
+                frame = Frame.from_png(screenshot_data)
+            if frame is None:
+                metrics.incr('capture_failures')
+                logger.warning("截图失败: 无法解码截图数据")
+            return frame
+        except Exception as e:
+            metrics.incr('capture_failures')
+            logger.warning(f"截图失败: {str(e)}")
+            return None
+
+    def _stream_frame(self):
+        """从截图流取最新一帧，流未启动或已断开时（重新）启动"""
+        if self.stream is not None and not self.stream.is_alive():
+            logger.warning("截图流已断开，重新启动")
+            self.stream.close()
+            self.stream = None
+        if self.stream is None:
+            if self._stream_header_size is None:
+                # 先单独截一帧确定帧头长度与像素格式
+                screenshot_data = self._screencap(raw=True)
+                header = Frame.parse_raw_header(screenshot_data)
+                if header is None:
+                    if screenshot_data:
+                        self._reject_raw_header()
+                    return None
+                self._raw_rejects = 0
+                self._stream_header_size = header[3]
             cmd = [self.adb_path]
             if self.device_id:
                 cmd.extend(['-s', self.device_id])
-            cmd.extend(['exec-out', 'screencap', '-p'])
+            cmd.extend(['exec-out', STREAM_SCRIPT])
+            self.stream = ScreenStream(cmd, self._stream_header_size, self.capture_timeout)
+            self.stream.start()
+        return self.stream.take(after=self._tapped_at)
 
-            proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            screenshot_data, _ = proc.communicate()
+    def _reject_raw_header(self):
+        """记录一次原始帧头无法识别，连续 raw_reject_limit 次后改用 PNG 截图"""
+        self._raw_rejects += 1
+        if self._raw_rejects < self.raw_reject_limit:
+            logger.warning(f"原始帧头无法识别（连续 {self._raw_rejects} 次）")
+            return
+        logger.warning(f"原始帧头连续 {self._raw_rejects} 次无法识别，改用 PNG 截图模式")
+        self.capture_mode = 'png'
 
-            with open(filename, 'wb') as f:
-                f.write(screenshot_data)
+    def _screencap(self, raw=False):
+        """执行 screencap 并返回原始字节；raw=True 时不在设备端做 PNG 编码"""
+        cmd = [self.adb_path]
+        if self.device_id:
+            cmd.extend(['-s', self.device_id])
+        cmd.extend(['exec-out', 'screencap'])
+        if not raw:
+            cmd.append('-p')
 
-            return True
+        proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        creationflags=CREATE_NO_WINDOW
+        )
+        try:
+            screenshot_data, _ = proc.communicate(timeout=self.capture_timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise TimeoutError(f"截图超时 ({self.capture_timeout}s)")
+        return screenshot_data
+
+    def shell(self, command, timeout=10):
+        """通过常驻 shell 会话执行命令，返回 (退出码, 输出)，失败返回 None"""
+        try:
+            return self.shell_pool.run(command, timeout)
         except Exception as e:
-            print(f"截图失败: {str(e)}")
-            return False
+            logger.warning(f"adb shell 命令失败 [{command}]: {str(e)}")
+            return None
 
     def tap_screen(self, x, y):
-        cmd = [self.adb_path]
-        if self.device_id:
-            cmd.extend(['-s', self.device_id])
-        cmd.extend(['shell', 'input', 'tap', str(x), str(y)])
-        
-        # 添加 creationflags 参数
-        subprocess.Popen(
-            cmd,
-            creationflags=subprocess.CREATE_NO_WINDOW,  # Windows隐藏窗口
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        # 复用常驻会话，不再为每次点击启动 adb 进程；命令完成后才返回
+        with metrics.timer('tap_seconds'):
+            self.shell(f"input tap {x} {y}")
+        self._tapped_at = time.time()
+        logger.debug("已点击坐标 (%s, %s)", x, y)
+
+    def tap_burst(self, x, y, times, interval=0):
+        """
+        连续点击：整批点击作为一个 shell 循环在设备端执行，返回时已全部执行完毕
+        :return: BurstResult，delivered 为设备端 input tap 成功的次数
+        """
+        pause = f" sleep {interval:g};" if interval > 0 else ""
+        script = (
+            f"n=0; i=0; while [ $i -lt {int(times)} ]; do "
+            f"input tap {x} {y} && n=$((n+1)); i=$((i+1));{pause} done; echo $n"
         )
-        print(f"已点击坐标 ({x}, {y})")
\ No newline at end of file
+        # 单次 input tap 在设备端约需数百毫秒，超时按次数放宽
+        timeout = 10 + times * (interval + 1)
+        start = time.time()
+        result = self.shell(script, timeout=timeout)
+        elapsed = time.time() - start
+        self._tapped_at = time.time()
+        metrics.observe('tap_burst_seconds', elapsed)
+
+        delivered = 0
+        if result is not None:
+            lines = result[1].split()
+            if lines and lines[-1].isdigit():
+                delivered = int(lines[-1])
+        return BurstResult(delivered, int(times), elapsed)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self.shell_pool.close()
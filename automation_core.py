@@ -0,0 +1,579 @@
+import logging
+import os
+import threading
+import time
+from config_loader import ConfigLoader
+from adb_utils import AdbUtils
+from step_run import StepRunner, SettleStats
+from exit_condition import ExitConditionChecker
+from image_utils import ImageUtils, RoiCache
+from frame_provider import FrameProvider
+from screen_classifier import ScreenClassifier
+from template_store import TemplateStore, ReloadWatcher
+from metrics import metrics
+from session_recorder import SessionRecorder
+from interrupt_watcher import InterruptWatcher, Interrupt, PRIORITY
+from connection_watchdog import ConnectionWatchdog
+from checkpoint import Checkpoint
+
+logger = logging.getLogger(__name__)
+
+class AutomationCore:
+    def __init__(self, config_path, adb_path, adb_ip, adb_port, device_id=None, adb_utils=None):
+        """
+        :param adb_utils: 可选的设备对象（如离线回放用的 FakeAdbUtils），缺省按 adb_path 创建 AdbUtils
+        """
+        self.config_path = config_path
+        self.config = ConfigLoader.load(config_path)
+        ConfigLoader.validate(self.config)
+        # 编译为不可变的执行计划，缺失的模板在连接设备前就会报错
+        self.plan = ConfigLoader.compile(self.config)
+        # 设备序列号：参数优先，其次读取配置中的 device_id；形如 ip:port 时直接连接该地址
+        self.device_id = device_id or self.config.get('device_id') or None
+        debug_screenshot = None
+        if self.config.get('debug_screenshot', False):
+            suffix = self.device_id.replace(':', '_') if self.device_id else ''
+            debug_screenshot = f"screen_{suffix}.png" if suffix else 'screen.png'
+        self.adb_utils = adb_utils or AdbUtils(
+            adb_path,
+            self.device_id,
+            debug_screenshot=debug_screenshot,
+            capture_mode=self.config.get('capture_mode', 'png'),
+            capture_timeout=self.config.get('capture_timeout', 10)
+        )
+        if self.device_id and ':' in self.device_id:
+            adb_ip, adb_port = self.device_id.rsplit(':', 1)
+        self.adb_utils.connect_emulator(adb_ip, adb_port)
+        self.running = True
+        # 连接看门狗：截图连续失败时按退避间隔重连，恢复后从当前步骤继续
+        self.watchdog = None
+        if self.config.get('reconnect', True):
+            self.watchdog = ConnectionWatchdog(
+                self.adb_utils, adb_ip, adb_port,
+                fail_limit=self.config.get('reconnect_after_failures', 3),
+                backoff=self.config.get('reconnect_backoff', (1, 2, 5, 10, 30, 60)),
+                max_attempts=self.config.get('reconnect_max_attempts', 0),
+                is_running=lambda: self.running
+            )
+        # 会话录制（可选）：截图、步骤、匹配分数与点击写入 record_dir 下按设备和时间命名的目录
+        self.recorder = None
+        if self.config.get('record_session', False):
+            name = (self.device_id or 'default').replace(':', '_')
+            self.recorder = SessionRecorder(
+                os.path.join(self.config.get('record_dir', 'recordings'), f"{name}_{time.strftime('%Y%m%d_%H%M%S')}"),
+                max_bytes=int(self.config.get('record_max_mb', 512) * 1024 * 1024),
+                segment_bytes=int(self.config.get('record_segment_mb', 16) * 1024 * 1024)
+            )
+        # 主循环每个 tick 内全局监听、退出检测与步骤共用同一次截图
+        self.frames = FrameProvider(
+            self.adb_utils,
+            self.config.get('frame_max_age', 0.5),
+            self.config.get('reference_resolution'),
+            recorder=self.recorder,
+            watchdog=self.watchdog
+        )
+        # 学习型搜索区域：优先在上次命中位置附近匹配
+        self.roi_cache = RoiCache(self.config.get('roi_padding', 40)) if self.config.get('roi_cache', True) else None
+        # 模板预处理包：按内容哈希保存的灰度数组与金字塔，内存映射加载；同一目录在进程内共用一个实例
+        self.template_store = None
+        if self.config.get('template_pack', True):
+            self.template_store = TemplateStore.shared(
+                self.config.get('template_pack_dir', os.path.join('image', '.pack'))
+            )
+        # 直方图预筛选（可选）：灰度分布上不可能包含模板的搜索区域直接跳过完整匹配
+        # 画面变暗或变亮时会误判，需先用 bench_flows.py --verify-prefilter 在录制的会话上确认没有误判再开启
+        ImageUtils.set_prefilter(
+            self.config.get('prefilter_ratio', 0.85) if self.config.get('prefilter', False) else 0,
+            self.config.get('prefilter_spread', 1)
+        )
+        ImageUtils.preload_templates(self.plan.templates.paths, self.template_store)
+        self.settle_stats = SettleStats()
+        self._apply_settings()
+        # 中断检测（可选）：后台线程在最新帧上检测退出条件、全局监听与辅助弹窗，可打断当前步骤
+        self.interrupts = None
+        if self.config.get('interrupt_watcher', False):
+            self.interrupts = InterruptWatcher(
+                self.frames, self.plan, self.roi_cache, self.config.get('interrupt_interval', 0.3)
+            )
+        # 热更新（可选）：运行中修改配置或模板图片后在步骤之间替换，不中断当前循环
+        self.watcher = None
+        if self.config.get('hot_reload', False):
+            self.watcher = ReloadWatcher(config_path, self.plan.templates.paths)
+        self.reload_interval = self.config.get('hot_reload_interval', 2)
+        self._last_reload_check = time.time()
+        self.reloads = 0
+        # 指标导出：JSONL 追踪与 Prometheus 文本文件，均为可选
+        self.metrics_file = self.config.get('metrics_file')
+        self.metrics_interval = self.config.get('metrics_interval', 30)
+        self.metrics_summary = self.config.get('metrics_summary', True)
+        if self.config.get('metrics_trace'):
+            metrics.configure(self.config['metrics_trace'])
+        self._last_export = time.time()
+        # 检查点：每个步骤开始前记录位置与计数，出错重连或进程异常退出后从该步骤继续
+        self.checkpoint = None
+        if self.config.get('checkpoint', True):
+            name = os.path.splitext(os.path.basename(config_path))[0]
+            device = (self.device_id or 'default').replace(':', '_')
+            self.checkpoint = Checkpoint(
+                self.config.get('checkpoint_file') or os.path.join('checkpoints', f"{name}_{device}.json")
+            )
+        self.checkpoint_max_age = self.config.get('checkpoint_max_age', 6 * 3600)
+        self.position = ('main', 0)
+        # 当前步骤的连续点击是否已送达，从检查点继续时跳过该步骤，不重复整批点击
+        self.burst_delivered = False
+        self.max_restarts = self.config.get('max_restarts', 5)
+        self.restarts = 0
+        self.started = None
+
+        # 运行状态与计数，供多设备调度汇总
+        self.status = "idle"
+        self.loop_count = 0
+        self.steps_done = 0
+        self.sub_loops = 0
+        self.timeouts = 0
+        self.recoveries = 0
+        self._stats_lock = threading.Lock()
+
+    def _apply_settings(self):
+        """读取运行期可调整的配置项，初始化与热更新配置时共用"""
+        self.check_interval = self.config.get('check_interval', 2)
+        self.min_check_interval = self.config.get('min_check_interval', 0.2)
+        self.change_tolerance = self.config.get('change_tolerance', 2.0)
+        # 界面识别（可选）：步骤走偏或超时后识别当前界面，直接跳到对应步骤继续
+        # 同一模板被多个步骤复用时可能跳错步骤，默认关闭
+        self.classifier = None
+        if self.config.get('screen_recovery', False):
+            self.classifier = ScreenClassifier(self.plan.screen_index, self.roi_cache)
+        # 需明显长于正常步骤的等待时间，避免动画或加载中途被判为走偏
+        self.recover_after = self.config.get('recover_after', 30)
+
+    def reload(self):
+        """
+        检查配置与模板是否变化并热更新
+        :return: 执行计划是否被替换（调用方需重建步骤执行器）
+        """
+        if self.watcher is None or time.time() - self._last_reload_check < self.reload_interval:
+            return False
+        self._last_reload_check = time.time()
+        config_changed, changed = self.watcher.poll()
+
+        if changed:
+            ImageUtils.reload_templates(changed, self.template_store)
+            if self.roi_cache:
+                for path in changed:
+                    self.roi_cache.forget(path)
+            logger.info(f"模板已更新: {', '.join(os.path.basename(p) for p in changed)}")
+        if not config_changed:
+            return False
+
+        try:
+            config = ConfigLoader.load(self.config_path)
+            ConfigLoader.validate(config)
+            plan = ConfigLoader.compile(config)
+        except Exception as e:
+            logger.warning(f"配置热更新失败，继续使用原配置: {str(e)}")
+            return False
+        ImageUtils.preload_templates(plan.templates.paths, self.template_store)
+        self.watcher.watch(plan.templates.paths)
+        self.config, self.plan = config, plan
+        if self.interrupts:
+            self.interrupts.set_plan(plan)
+        self._apply_settings()
+        self.reloads += 1
+        logger.info("配置已更新，从当前步骤继续")
+        return True
+
+    def stats(self):
+        """当前运行状态与计数的快照"""
+        with self._stats_lock:
+            return {
+                "device": self.device_id or "default",
+                "status": "reconnecting" if self.watchdog and self.watchdog.down_since else self.status,
+                "loops": self.loop_count,
+                "steps": self.steps_done,
+                "sub_loops": self.sub_loops,
+                "timeouts": self.timeouts,
+                "recoveries": self.recoveries,
+                "reloads": self.reloads,
+                "captures": self.frames.captures,
+                "restarts": self.restarts,
+                "reconnects": self.watchdog.reconnects if self.watchdog else 0,
+                "downtime": round(self.watchdog.downtime, 1) if self.watchdog else 0.0,
+            }
+
+    def loops_per_hour(self):
+        if not self.started:
+            return 0.0
+        hours = (time.time() - self.started) / 3600
+        return self.loop_count / hours if hours > 0 else 0.0
+
+    def export_metrics(self, force=False):
+        """把运行计数写入指标并导出文件，运行中每 metrics_interval 秒一次"""
+        if not force and time.time() - self._last_export < self.metrics_interval:
+            return
+        self._last_export = time.time()
+        for key, value in self.stats().items():
+            if isinstance(value, (int, float)):
+                metrics.set_gauge(f"core_{key}", value)
+        metrics.set_gauge('loops_per_hour', self.loops_per_hour())
+        metrics.flush()
+        if self.metrics_file:
+            try:
+                metrics.write_prometheus(self.metrics_file)
+            except OSError as e:
+                logger.warning(f"指标文件写入失败: {str(e)}")
+
+    def _set_status(self, status):
+        with self._stats_lock:
+            self.status = status
+
+    def _recover(self, runner, kind, current, length):
+        """步骤未完成时识别当前界面，返回跳转位置 (kind, index)，无法识别时返回 None"""
+        match, runner.redirect = runner.redirect, None
+        redirected = match is not None
+        if self.classifier is None:
+            return None
+        if match is None:
+            # 步骤超时：再识别一次当前界面
+            frame = self.frames.get(0)
+            match = self.classifier.classify(frame) if frame is not None else None
+        if match is None:
+            return None
+        jump = ScreenClassifier.resolve(match, kind, current, length)
+        if jump is not None and jump[0] == kind and self._repeats_burst(kind, current, jump[1], length):
+            # 回退到连续点击的步骤会重复整批点击（如重复购买），不跳转：走偏时重试当前步骤，超时则按超时处理
+            logger.warning(f"识别到界面 [{os.path.basename(match.path)}] 对应步骤 {jump[1]}，回退会重复之前的连续点击，不跳转")
+            return (kind, current) if redirected else None
+        if jump is not None:
+            self.recoveries += 1
+            logger.info(f"识别到界面 [{os.path.basename(match.path)}]，跳转到 {jump[0]} 步骤 {jump[1]}")
+        return jump
+
+    def _repeats_burst(self, kind, current, target, length):
+        """向后回退时，从目标步骤重新执行到当前步骤之间是否包含 click_times > 1 的步骤"""
+        loop_plan = self.plan.main if kind == 'main' else self.plan.sub
+        _, backward = ScreenClassifier.distance(current, target, length)
+        if not backward or target == current:
+            return False
+        # 跨过循环开头回退时，重新执行的是 target..末尾 与 0..current
+        replayed = range(target, current) if target < current else list(range(target, length)) + list(range(current))
+        return any(loop_plan.steps[index].click_times > 1 for index in replayed)
+
+    def check_global_monitor(self):
+        return self._check_condition(self.plan.monitor)
+
+    def _check_condition(self, condition, max_frame_age=None):
+        """检测 ConditionNode（全局监听触发图或退出条件）是否出现在当前帧"""
+        if condition is None:
+            return False
+        frame = self.frames.get(condition.max_frame_age if max_frame_age is None else max_frame_age)
+        if frame is None:
+            return False
+        position = ImageUtils.find_image(
+            frame, condition.path, condition.threshold, condition.region, self.roi_cache
+        )
+        return position is not None
+
+    def _make_runners(self):
+        """按当前计划创建主循环、子循环执行器与退出检测"""
+        plan = self.plan
+        # 主循环检测辅助步骤；子循环与原先一致，不检测辅助步骤
+        # 启用中断检测时辅助步骤由后台线程检测，主循环步骤可被中断
+        if self.interrupts:
+            step_runner = self._make_runner(plan.main, interrupts=self.interrupts)
+        else:
+            step_runner = self._make_runner(plan.main, plan.helpers)
+        sub_step_runner = self._make_runner(plan.sub) if plan.sub else None
+        exit_checker = ExitConditionChecker(
+            plan, self.adb_utils, frame_provider=self.frames, roi_cache=self.roi_cache
+        )
+        return step_runner, sub_step_runner, exit_checker
+
+    def _make_runner(self, loop_plan, helpers=(), interrupts=None):
+        return StepRunner(
+            loop_plan, self.adb_utils, self.check_interval,
+            frame_provider=self.frames, roi_cache=self.roi_cache,
+            min_check_interval=self.min_check_interval,
+            change_tolerance=self.change_tolerance,
+            settle_stats=self.settle_stats,
+            classifier=self.classifier,
+            recover_after=self.recover_after,
+            helpers=helpers,
+            is_running=lambda: self.running,
+            recorder=self.recorder,
+            interrupts=interrupts,
+            on_burst=self._burst_done
+        )
+
+    def _next_interrupt(self, sub_step_runner, exit_checker):
+        """
+        取出待处理的中断，优先级为 退出条件 > 全局监听 > 辅助弹窗
+        未启用中断检测时在步骤之间同步检测退出条件与全局监听，辅助弹窗仍由步骤轮询处理
+        :return: Interrupt，没有时返回 None
+        """
+        if self.interrupts:
+            interrupt = self.interrupts.take()
+            if interrupt is not None:
+                metrics.observe('interrupt_seconds', time.time() - interrupt.frame.timestamp, kind=interrupt.kind)
+            return interrupt
+        if exit_checker.check_exit_condition():
+            return Interrupt('exit', self.plan.main.exit, None, None)
+        if sub_step_runner and self.check_global_monitor():
+            return Interrupt('monitor', self.plan.monitor, None, None)
+        return None
+
+    def _watch(self, kinds):
+        """切换中断检测范围，并忽略切换前截取的帧"""
+        if self.interrupts:
+            self.interrupts.set_scope(kinds)
+            self.interrupts.resume()
+
+    def _run_helper(self, runner, interrupt):
+        """处理辅助弹窗中断：处理期间暂停检测，完成后回到被打断的步骤"""
+        self._watch(())
+        runner.run_helper(interrupt.node, interrupt.position, interrupt.frame)
+        self._watch(PRIORITY)
+
+    def _checkpoint(self, kind, index, burst_delivered=False):
+        """记录步骤边界上的位置；启用检查点时同时写入磁盘，出错或进程异常退出后从这里继续"""
+        self.position = (kind, index)
+        self.burst_delivered = burst_delivered
+        if self.checkpoint is None:
+            return
+        loop_plan = self.plan.main if kind == 'main' else self.plan.sub
+        self.checkpoint.save({
+            "loop": kind,
+            "step": index,
+            "length": len(loop_plan.steps),
+            "loop_count": self.loop_count,
+            "steps_done": self.steps_done,
+            "sub_loops": self.sub_loops,
+            "timeouts": self.timeouts,
+            "recoveries": self.recoveries,
+            "burst_delivered": burst_delivered,
+        })
+
+    def _burst_done(self, kind, index):
+        """连续点击送达后立即记录，出错后不再从该步骤开头重新执行"""
+        self._checkpoint(kind, index, burst_delivered=True)
+
+    def _skip_delivered_burst(self):
+        """检查点位于连续点击已送达的步骤时，从其下一步继续"""
+        if not self.burst_delivered:
+            return
+        kind, index = self.position
+        logger.info(f"{kind} 步骤 {index} 的连续点击已送达，从下一步继续")
+        self.burst_delivered = False
+        self.steps_done += 1
+        index += 1
+        if kind == 'main' and index >= len(self.plan.main.steps):
+            self.loop_count += 1
+            index = 0
+        elif kind == 'sub' and index >= len(self.plan.sub.steps):
+            kind, index = 'main', self.plan.transitions['sub_end'][1]
+        self.position = (kind, index)
+
+    def _restore(self):
+        """读取磁盘上的检查点，恢复位置与计数；步骤数与当前配置不一致时从头开始"""
+        state = self.checkpoint.load(self.checkpoint_max_age) if self.checkpoint else None
+        if state is None:
+            return
+        kind = state.get('loop')
+        loop_plan = self.plan.main if kind == 'main' else self.plan.sub if kind == 'sub' else None
+        if loop_plan is None or state.get('length') != len(loop_plan.steps):
+            logger.warning("检查点与当前配置的步骤不一致，从头开始")
+            return
+        self.position = (kind, state['step'])
+        self.loop_count = state.get('loop_count', 0)
+        self.steps_done = state.get('steps_done', 0)
+        self.sub_loops = state.get('sub_loops', 0)
+        self.timeouts = state.get('timeouts', 0)
+        self.recoveries = state.get('recoveries', 0)
+        self.burst_delivered = state.get('burst_delivered', False)
+        logger.info(f"从检查点继续: {kind} 步骤 {state['step']}，已完成 {self.loop_count} 次主循环")
+
+    def run(self):
+        self._set_status("running")
+        # 本线程记录的指标都带上设备标签
+        metrics.bind(device=self.device_id or "default")
+        self.started = time.time()
+        try:
+            self._restore()
+            if self.interrupts:
+                self.interrupts.start(device=self.device_id or "default")
+            while True:
+                try:
+                    self._run_loops()
+                    break
+                except Exception as e:
+                    # 运行中出错：重连设备后从最近的步骤边界继续，超过次数上限才结束
+                    if not self.running or self.restarts >= self.max_restarts:
+                        raise
+                    self.restarts += 1
+                    logger.exception(f"自动化执行出错，第 {self.restarts} 次从检查点继续: {str(e)}")
+                    if self.watchdog and not self.watchdog.reconnect():
+                        raise
+
+        except Exception as e:
+            self._set_status("failed")
+            logger.exception(f"自动化执行失败: {str(e)}")
+        finally:
+            if self.checkpoint and self.status != "failed":
+                # 正常结束、手动停止或超时后下次从头开始，只有出错退出才保留检查点
+                self.checkpoint.clear()
+            if self.interrupts:
+                self.interrupts.stop()
+            self.adb_utils.close()
+            if self.recorder:
+                self.recorder.close()
+            self.report()
+
+    def _run_loops(self):
+        """从 self.position 开始运行主循环与子循环，直到结束、停止或出错"""
+        self._set_status("running")
+        plan = self.plan
+        step_runner, sub_step_runner, exit_checker = self._make_runners()
+        max_loops = plan.max_loops
+        main_steps = plan.main.steps
+
+        self._skip_delivered_burst()
+        kind, index = self.position
+        in_sub_loop = kind == 'sub' and sub_step_runner is not None
+        current_main_step = index if kind == 'main' and index < len(main_steps) else 0
+        sub_start_step = index if in_sub_loop else 0
+        # 从检查点回到子循环时该次子循环已计数
+        resumed_sub = in_sub_loop
+        self._watch(PRIORITY)
+
+        while self.running and self.loop_count < max_loops:
+            if in_sub_loop:
+                # 子循环与原先一致，不检测退出条件、全局监听与辅助弹窗
+                self._watch(())
+                self._set_status("sub_loop")
+                if not resumed_sub:
+                    self.sub_loops += 1
+                resumed_sub = False
+                sub_steps = plan.sub.steps
+                sub_loop_exit = False
+                next_main_step = plan.transitions['sub_end'][1]
+                current_sub_step, sub_start_step = sub_start_step, 0
+
+                while current_sub_step < len(sub_steps) and self.running:
+                    self._checkpoint('sub', current_sub_step)
+                    success = sub_step_runner.run_step(sub_steps[current_sub_step], current_sub_step)
+                    if not self.running:
+                        break
+                    if success:
+                        self.steps_done += 1
+                        current_sub_step += 1
+                        continue
+                    jump = self._recover(sub_step_runner, 'sub', current_sub_step, len(sub_steps))
+                    if jump and jump[0] == 'sub':
+                        current_sub_step = jump[1]
+                        continue
+                    if jump and jump[0] == 'main':
+                        next_main_step = jump[1]
+                    else:
+                        self.timeouts += 1
+                    sub_loop_exit = True
+                    break
+
+                if not sub_loop_exit and self._check_condition(plan.sub.exit):
+                    sub_loop_exit = True
+
+                in_sub_loop = False
+                current_main_step = next_main_step
+                self._watch(PRIORITY)
+                self._set_status("running")
+                continue
+
+            logger.info(f"--- 主循环第 {self.loop_count+1} 次 ---")
+            loop_start = time.perf_counter()
+            while current_main_step < len(main_steps) and self.running:
+                self._checkpoint('main', current_main_step)
+                self.export_metrics()
+                if self.reload():
+                    plan = self.plan
+                    step_runner, sub_step_runner, exit_checker = self._make_runners()
+                    max_loops = plan.max_loops
+                    main_steps = plan.main.steps
+                    if not main_steps:
+                        break
+                    # 步骤数减少时停在新计划的最后一步
+                    current_main_step = min(current_main_step, len(main_steps) - 1)
+                interrupt = self._next_interrupt(sub_step_runner, exit_checker)
+                if interrupt is not None:
+                    if interrupt.kind == 'exit':
+                        logger.info("满足主循环退出条件，终止程序")
+                        self._set_status("finished")
+                        return
+                    if interrupt.kind == 'monitor':
+                        logger.info("检测到全局触发图像，进入子循环")
+                        in_sub_loop = True
+                        sub_start_step = plan.transitions['monitor'][1]
+                        break
+                    # 辅助弹窗处理完后重新执行被打断的步骤
+                    self._run_helper(step_runner, interrupt)
+                    continue
+                success = step_runner.run_step(main_steps[current_main_step], current_main_step)
+                if not self.running:
+                    break
+                if not success and step_runner.interrupted():
+                    continue
+                if not success:
+                    jump = self._recover(step_runner, 'main', current_main_step, len(main_steps))
+                    if jump is None:
+                        self.timeouts += 1
+                        self._set_status("timeout")
+                        return
+                    if jump[0] == 'exit':
+                        logger.info("识别到主循环退出界面，终止程序")
+                        self._set_status("finished")
+                        return
+                    if jump[0] in ('monitor', 'sub') and sub_step_runner:
+                        in_sub_loop = True
+                        sub_start_step = jump[1] or 0
+                        break
+                    if jump[0] != 'main':
+                        self.timeouts += 1
+                        self._set_status("timeout")
+                        return
+                    _, backward = ScreenClassifier.distance(current_main_step, jump[1], len(main_steps))
+                    if jump[1] < current_main_step and not backward:
+                        # 向前跳过循环末尾回到开头，视为进入下一次主循环
+                        self.loop_count += 1
+                    current_main_step = jump[1]
+                    continue
+                self.steps_done += 1
+                current_main_step += 1
+            if not self.running:
+                break
+            if not in_sub_loop:
+                metrics.observe('loop_seconds', time.perf_counter() - loop_start)
+            self.loop_count += 1
+            current_main_step = 0
+
+        self._set_status("finished" if self.running else "stopped")
+
+    def report(self):
+        self.export_metrics(force=True)
+        logger.info(f"总共完成 {self.loop_count} 次主循环，每小时 {self.loops_per_hour():.1f} 次")
+        logger.info(f"截图 {self.frames.captures} 次，复用 {self.frames.reuses} 次")
+        if self.watchdog and (self.watchdog.reconnects or self.restarts):
+            logger.info(
+                f"重连 {self.watchdog.reconnects} 次，中断共 {self.watchdog.downtime:.1f} 秒，出错后继续 {self.restarts} 次"
+            )
+        if self.roi_cache:
+            logger.info(self.roi_cache.summary())
+        if self.interrupts:
+            logger.info(f"中断检测 {self.interrupts.checks} 次")
+        if self.recorder:
+            logger.info(
+                f"会话录制 {self.recorder.path}: 写入 {self.recorder.written} 条，"
+                f"丢弃 {self.recorder.dropped} 条，淘汰分段 {self.recorder.evicted} 个"
+            )
+        for line in self.settle_stats.summary():
+            logger.info(line)
+        if self.metrics_summary:
+            for line in metrics.summary(self.device_id or "default"):
+                logger.info(line)
@@ -0,0 +1,80 @@
+"""
+截图模式对比：PNG (screencap -p) 与原始帧缓冲 (screencap)
+
+录制样本（需要连接设备）:
+    python benchmarks/bench_capture.py --record 10 --adb <adb路径> [--device <序列号>]
+离线对比解码耗时:
+    python benchmarks/bench_capture.py
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adb_utils import AdbUtils
+from frame import Frame
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'capture')
+
+
+def record(adb_path, device_id, count):
+    """从设备分别以两种模式录制样本"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    adb = AdbUtils(adb_path, device_id)
+    for mode in ('png', 'raw'):
+        total = 0.0
+        for i in range(count):
+            start = time.perf_counter()
+            data = adb._screencap(raw=(mode == 'raw'))
+            total += time.perf_counter() - start
+            with open(os.path.join(FIXTURE_DIR, f"{mode}_{i:03d}.bin"), 'wb') as f:
+                f.write(data)
+        print(f"[{mode}] adb 截图平均耗时: {total / count * 1000:.1f} ms")
+
+
+def bench_decode(mode, repeat):
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, f"{mode}_*.bin")))
+    if not paths:
+        print(f"[{mode}] 没有样本，请先使用 --record 录制")
+        return
+    blobs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            blobs.append(f.read())
+    decode = Frame.from_raw if mode == 'raw' else Frame.from_png
+
+    start = time.perf_counter()
+    shape = None
+    for _ in range(repeat):
+        for data in blobs:
+            frame = decode(data)
+            if frame is None:
+                print(f"[{mode}] 样本无法解码")
+                return
+            shape = frame.shape
+    elapsed = time.perf_counter() - start
+    count = repeat * len(blobs)
+    avg_size = sum(len(b) for b in blobs) / len(blobs)
+    print(f"[{mode}] {shape} 样本 {len(blobs)} 张, 平均 {avg_size / 1024:.0f} KB, "
+          f"解码 {elapsed / count * 1000:.2f} ms/帧")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="截图模式对比")
+    parser.add_argument('--record', type=int, default=0, help="从设备录制的样本数")
+    parser.add_argument('--adb', default='adb', help="ADB 路径")
+    parser.add_argument('--device', default=None, help="设备序列号")
+    parser.add_argument('--repeat', type=int, default=20, help="解码重复次数")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.adb, args.device, args.record)
+    for mode in ('png', 'raw'):
+        bench_decode(mode, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+流程基准：用离线替身设备完整运行 config.json 与 daysonly.json 的主循环，不需要模拟器
+
+    python benchmarks/bench_flows.py [--loops 3] [--real-delays] [--capture-latency 0.05] [--replay <画面目录或会话目录>]
+                                     [--prefilter-ratio 0.85] [--verify-prefilter]
+
+默认把 post_delay 与点击间隔置 0，只测量截图之后的处理开销：
+每秒轮询次数、每个步骤的耗时分位数，以及每个模板的匹配耗时
+--verify-prefilter 时被直方图预筛选排除的模板仍完整匹配，统计排除率与误判（排除了实际命中的模板）次数
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from automation_core import AutomationCore
+from config_loader import ConfigLoader
+from fake_adb import FakeAdbUtils
+from image_utils import ImageUtils
+from log_utils import setup_logging
+from metrics import metrics, percentile
+
+FLOWS = ('config.json', 'daysonly.json')
+
+
+def without_delays(plan):
+    """去掉固定等待，基准只反映处理开销"""
+    def strip(loop_plan):
+        if loop_plan is None:
+            return None
+        steps = tuple(step._replace(post_delay=0, click_interval=0, settle=None) for step in loop_plan.steps)
+        return loop_plan._replace(steps=steps)
+    helpers = tuple(helper._replace(post_delay=0, settle=None) for helper in plan.helpers)
+    return plan._replace(main=strip(plan.main), sub=strip(plan.sub), helpers=helpers)
+
+
+def run_flow(config_name, loops, real_delays, capture_latency, popup_every, replay, prefilter_ratio=None):
+    config_path = os.path.join(ROOT, config_name)
+    plan = ConfigLoader.compile(ConfigLoader.load(config_path))
+    if replay:
+        device = FakeAdbUtils.from_replay(replay, capture_latency=capture_latency)
+    else:
+        device = FakeAdbUtils.from_plan(plan, popup_every=popup_every, capture_latency=capture_latency)
+
+    core = AutomationCore(config_path, 'adb', '127.0.0.1', 0, adb_utils=device)
+    core.watcher = None  # 基准运行期间不做热更新检查
+    core.checkpoint = None  # 每次都从第 0 步开始，不读写检查点
+    if prefilter_ratio is not None:
+        ImageUtils.set_prefilter(prefilter_ratio)
+    core.plan = plan._replace(max_loops=loops) if real_delays else without_delays(plan._replace(max_loops=loops))
+    metrics.reset()
+
+    start = time.perf_counter()
+    core.run()
+    elapsed = time.perf_counter() - start
+    return core, device, elapsed
+
+
+def report(config_name, core, device, elapsed):
+    polls = sum(v for (name, _), v in metrics.counters.items() if name == 'polls')
+    print(f"\n=== {config_name} ===")
+    print(f"状态 {core.status}，主循环 {core.loop_count} 次，步骤 {core.steps_done} 个，"
+          f"超时 {core.timeouts} 次，界面识别跳转 {core.recoveries} 次，耗时 {elapsed:.2f} 秒")
+    print(f"截图 {device.captures} 次，点击 {len(device.taps)} 次，"
+          f"轮询 {polls / elapsed:.1f} 次/秒，步骤 {core.steps_done / elapsed:.1f} 个/秒")
+
+    step_samples = []
+    match_rows = []
+    for (name, labels), series in metrics.series.items():
+        if name == 'step_seconds':
+            step_samples.extend(series.samples)
+        elif name == 'match_seconds':
+            match_rows.append((dict(labels)['template'], series.count, series.total))
+    step_samples.sort()
+    matches = sum(series.count for (name, _), series in metrics.series.items() if name == 'match_seconds')
+    skips = sum(v for (name, _), v in metrics.counters.items() if name == 'prefilter_skips')
+    false_rejects = sum(v for (name, _), v in metrics.counters.items() if name == 'prefilter_false_rejects')
+    if ImageUtils.prefilter_verify:
+        print(f"预筛选排除 {skips} 次，误判 {false_rejects} 次")
+    elif matches:
+        print(f"预筛选排除 {skips}/{matches} 次匹配 ({skips / matches * 100:.1f}%)")
+    interrupts = sum(v for (name, _), v in metrics.counters.items() if name == 'interrupts')
+    if interrupts:
+        latency = sorted(s for (name, _), series in metrics.series.items()
+                         if name == 'interrupt_seconds' for s in series.samples)
+        print(f"中断 {interrupts} 次，检测到处理的延迟 p50 {percentile(latency, 0.5) * 1000:.1f}ms"
+              if latency else f"中断 {interrupts} 次")
+    if step_samples:
+        print("步骤耗时: " + ", ".join(
+            f"p{int(q * 100)} {percentile(step_samples, q) * 1000:.1f}ms" for q in metrics.QUANTILES
+        ))
+    total_match = sum(total for _, _, total in match_rows)
+    print(f"匹配总耗时 {total_match * 1000:.0f}ms，占运行时间 {total_match / elapsed * 100:.1f}%（多线程时可超过 100%）")
+    for template, count, total in sorted(match_rows, key=lambda row: -row[2])[:10]:
+        print(f"  {template:<20} {count:>5} 次  平均 {total / count * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线流程基准")
+    parser.add_argument('--loops', type=int, default=3, help="每个流程运行的主循环次数")
+    parser.add_argument('--flows', nargs='*', default=list(FLOWS), help="要运行的配置文件")
+    parser.add_argument('--real-delays', action='store_true', help="保留配置中的 post_delay 与点击间隔")
+    parser.add_argument('--capture-latency', type=float, default=0.0, help="模拟每次截图的耗时(秒)")
+    parser.add_argument('--popup-every', type=int, default=5, help="每切换多少次画面插入一次弹窗，0 为不插入")
+    parser.add_argument('--replay', default=None, help="使用画面目录或录制的会话代替合成画面")
+    parser.add_argument('--prefilter-ratio', type=float, default=None, help="开启预筛选并使用该包含率（覆盖配置），0 为关闭")
+    parser.add_argument('--verify-prefilter', action='store_true', help="被预筛选排除的模板仍完整匹配，统计误判")
+    args = parser.parse_args()
+    ImageUtils.prefilter_verify = args.verify_prefilter
+
+    os.chdir(ROOT)
+    setup_logging({'log_level': 'WARNING'})
+    for config_name in args.flows:
+        core, device, elapsed = run_flow(
+            config_name, args.loops, args.real_delays, args.capture_latency, args.popup_every, args.replay,
+            args.prefilter_ratio
+        )
+        report(config_name, core, device, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    运行位置与计数的检查点：先写临时文件再整体替换，进程在写入途中退出也不会留下不完整的文件
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def save(self, state):
+        directory = os.path.dirname(self.path)
+        temp_path = f"{self.path}.tmp"
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(state, saved_at=time.time()), f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"检查点写入失败: {str(e)}")
+
+    def load(self, max_age=None):
+        """
+        读取检查点
+        :param max_age: 超过该秒数的检查点视为过期，None 为不限
+        :return: 状态字典，不存在、损坏或过期时返回 None
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"检查点无法读取，忽略: {str(e)}")
+            return None
+        if max_age and time.time() - state.get('saved_at', 0) > max_age:
+            logger.info(f"检查点已超过 {max_age} 秒，忽略")
+            return None
+        return state
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"检查点删除失败: {str(e)}")
@@ -2,6 +2,8 @@ import os
 import json
 import yaml
 from typing import Dict, Any
+from adb_utils import CAPTURE_MODES
+from plan import Plan, compile_plan
 
 class ConfigLoader:
     @staticmethod
@@ -40,7 +42,61 @@ class ConfigLoader:
         for i, step in enumerate(config['steps']):
             if 'targets' not in step:
                 raise ValueError(f"步骤 {i+1} 缺少 targets 配置")
+
+        ConfigLoader._validate_regions(config)
+
+        settle = config.get('settle')
+        if settle is not None and not isinstance(settle, (bool, dict)):
+            raise ValueError(f"settle 应为 true/false 或包含 stable、timeout 的对象: {settle}")
+
+        resolution = config.get('reference_resolution')
+        if resolution is not None and (
+                not isinstance(resolution, (list, tuple)) or len(resolution) != 2
+                or not all(isinstance(v, int) and v > 0 for v in resolution)):
+            raise ValueError(f"reference_resolution 应为 [width, height] 正整数列表: {resolution}")
+
+        capture_mode = config.get('capture_mode', 'png')
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"不支持的截图模式: {capture_mode}")
                 
+    @staticmethod
+    def compile(config: Dict[str, Any]) -> Plan:
+        """
+        编译为不可变的执行计划：解析好阈值、偏移、优先级，模板路径去重
+        :raises ValueError: 引用的模板文件不存在
+        """
+        return compile_plan(config)
+
+    @staticmethod
+    def _validate_regions(config: Dict[str, Any]):
+        """校验所有 region 字段：[x, y, w, h]，x/y 非负，w/h 为正"""
+        def check(region, where):
+            if region is None:
+                return
+            if (not isinstance(region, (list, tuple)) or len(region) != 4
+                    or not all(isinstance(v, int) and not isinstance(v, bool) for v in region)):
+                raise ValueError(f"{where} 的 region 应为 [x, y, w, h] 整数列表")
+            x, y, w, h = region
+            if x < 0 or y < 0 or w <= 0 or h <= 0:
+                raise ValueError(f"{where} 的 region 超出有效范围: {region}")
+
+        def check_steps(steps, prefix):
+            for i, step in enumerate(steps):
+                for target in step.get('targets', []):
+                    check(target.get('region'), f"{prefix}步骤 {i+1} 目标 {target.get('path')}")
+                check(step.get('loop_until_region'), f"{prefix}步骤 {i+1} 的 loop_until_target")
+
+        check_steps(config.get('steps', []), "")
+        for name, helper in config.get('helper_steps', {}).items():
+            check(helper.get('region'), f"辅助步骤 {name}")
+        check(config.get('loop', {}).get('exit_condition', {}).get('region'), "循环退出条件")
+        if 'global_monitor' in config:
+            monitor = config['global_monitor']
+            check(monitor.get('region'), "全局监听")
+            target_loop = monitor.get('target_loop', {})
+            check_steps(target_loop.get('steps', []), "子循环")
+            check(target_loop.get('exit_condition', {}).get('region'), "子循环退出条件")
+
     @staticmethod
     def _apply_default_image_path(config: Dict[str, Any], base_dir: str = "image"):
         def prepend_path(path):
@@ -0,0 +1,92 @@
+import logging
+import time
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionWatchdog:
+    """
+    连接看门狗：截图连续失败（adb 断开、模拟器重启、截图卡住超时）达到 fail_limit 次时判定连接中断，
+    按退避间隔调用 connect_emulator 重连，直到截图恢复
+    """
+
+    def __init__(self, adb_utils, ip, port, fail_limit=3, backoff=(1, 2, 5, 10, 30, 60), max_attempts=0,
+                 is_running=None):
+        """
+        :param backoff: 第 n 次重连前等待的秒数，超出部分沿用最后一项
+        :param max_attempts: 单次中断最多重连次数，0 为不限
+        :param is_running: 返回是否继续运行的函数，停止后放弃重连
+        """
+        self.adb_utils = adb_utils
+        self.address = (ip, port)
+        self.fail_limit = fail_limit
+        self.backoff = tuple(backoff)
+        self.max_attempts = max_attempts
+        self.is_running = is_running or (lambda: True)
+        self.failures = 0
+        self.down_since = None
+        self.reconnects = 0
+        self.downtime = 0.0
+
+    def capture_ok(self):
+        if self.failures:
+            self.failures = 0
+            self.down_since = None
+
+    def capture_failed(self):
+        """
+        记录一次截图失败，达到上限时重连
+        :return: 是否执行了重连且已恢复（调用方应重新截图）
+        """
+        self.failures += 1
+        if self.down_since is None:
+            self.down_since = time.time()
+        if self.failures < self.fail_limit:
+            return False
+        logger.warning(f"连续 {self.failures} 次截图失败，判定设备连接中断")
+        return self.reconnect()
+
+    def reconnect(self):
+        """
+        按退避间隔重连直到截图恢复
+        :return: 是否恢复；停止运行或超过 max_attempts 时返回 False
+        """
+        if self.down_since is None:
+            self.down_since = time.time()
+        attempt = 0
+        while self.is_running():
+            if self.max_attempts and attempt >= self.max_attempts:
+                break
+            delay = self.backoff[min(attempt, len(self.backoff) - 1)]
+            attempt += 1
+            logger.warning(f"{delay} 秒后第 {attempt} 次重连 {self.address[0]}:{self.address[1]}")
+            if not self._sleep(delay):
+                break
+            try:
+                self.adb_utils.connect_emulator(*self.address)
+                frame = self.adb_utils.take_screenshot()
+            except Exception as e:
+                logger.warning(f"重连失败: {str(e)}")
+                frame = None
+            metrics.incr('reconnects', result='ok' if frame is not None else 'failed')
+            if frame is not None:
+                downtime = time.time() - self.down_since
+                self.reconnects += 1
+                self.downtime += downtime
+                metrics.observe('downtime_seconds', downtime)
+                logger.info(f"设备已恢复，中断 {downtime:.1f} 秒")
+                self.failures = 0
+                self.down_since = None
+                return True
+        logger.error(f"重连 {attempt} 次仍未恢复")
+        return False
+
+    def _sleep(self, seconds):
+        """分段等待，停止运行时尽快返回 False"""
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            if not self.is_running():
+                return False
+            time.sleep(min(0.5, deadline - time.time()))
+        return self.is_running()
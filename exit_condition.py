@@ -1,20 +1,26 @@
 from image_utils import ImageUtils
+from frame_provider import FrameProvider
 
 class ExitConditionChecker:
-    def __init__(self, config, adb_utils, enable_exit_condition=True):
-        self.config = config
+    def __init__(self, plan, adb_utils, enable_exit_condition=True, frame_provider=None, roi_cache=None):
+        self.condition = plan.main.exit
         self.adb_utils = adb_utils
         self.enable_exit_condition = enable_exit_condition
+        self.frames = frame_provider or FrameProvider(adb_utils)
+        self.roi_cache = roi_cache
 
     def check_exit_condition(self):
         if not self.enable_exit_condition:
             return False
         
-        if not self.config['loop'].get('exit_condition'):
+        if self.condition is None:
             return False
             
-        if self.adb_utils.take_screenshot():
-            target = self.config['loop']['exit_condition']['target']
-            threshold = self.config['loop']['exit_condition'].get('threshold', 0.8)
-            return ImageUtils.find_image('screen.png', target, threshold) is not None
+        exit_condition = self.condition
+        frame = self.frames.get(exit_condition.max_frame_age)
+        if frame is not None:
+            position = ImageUtils.find_image(
+                frame, exit_condition.path, exit_condition.threshold, exit_condition.region, self.roi_cache
+            )
+            return position is not None
         return False
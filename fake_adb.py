@@ -0,0 +1,200 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+from adb_utils import BurstResult
+from frame import Frame
+
+logger = logging.getLogger(__name__)
+
+# 离线替身设备：不调用 adb，按状态表返回画面并响应点击，用于回放与基准测试
+# 接口与 AdbUtils 一致，可直接传给 AutomationCore(adb_utils=...)
+
+# 点击区域 (x, y, w, h) 与点击后切换到的画面名
+Transition = namedtuple('Transition', ['box', 'next'])
+
+# 弹窗画面的跳转目标：回到弹出前的画面
+RESUME = '<resume>'
+
+
+class FakeScreen:
+    __slots__ = ('name', 'image', 'transitions')
+
+    def __init__(self, name, image, transitions=()):
+        self.name = name
+        self.image = image
+        self.transitions = list(transitions)
+
+    def target(self, x, y):
+        """点击坐标落在哪个区域上，返回下一个画面名，未命中返回 None"""
+        for box, next_name in self.transitions:
+            bx, by, bw, bh = box
+            if bx <= x < bx + bw and by <= y < by + bh:
+                return next_name
+        return None
+
+
+class FakeAdbUtils:
+    """
+    画面状态机：take_screenshot 返回当前画面，点击命中状态表中的区域时切换画面
+    advance='tap' 时没有状态表的画面序列在每次点击后前进一帧，'capture' 时每次截图前进一帧
+    """
+
+    def __init__(self, screens, start, device_id='fake', advance='tap', loop=True,
+                 capture_latency=0.0, tap_latency=0.0):
+        self.screens = screens
+        self.order = list(screens)
+        self.current = start
+        self.device_id = device_id
+        self.advance = advance
+        self.loop = loop
+        # 模拟真实设备的截图与点击耗时（秒）
+        self.capture_latency = capture_latency
+        self.tap_latency = tap_latency
+        self.capture_mode = 'fake'
+        # 每切换 popup_every 次画面先显示一次 'popup' 画面，模拟辅助步骤要处理的弹窗
+        self.popup_every = 0
+        self._switches = 0
+        self._resume = None
+        self.captures = 0
+        self.taps = []  # [(时间, x, y, 点击时的画面名)]
+        self._lock = threading.Lock()
+
+    def connect_emulator(self, ip, port):
+        logger.info(f"离线设备 [{self.device_id}]，共 {len(self.screens)} 个画面")
+
+    def take_screenshot(self):
+        if self.capture_latency:
+            time.sleep(self.capture_latency)
+        with self._lock:
+            screen = self.screens.get(self.current)
+            self.captures += 1
+            if self.advance == 'capture':
+                self._step_sequence()
+        return Frame(screen.image) if screen is not None else None
+
+    def shell(self, command, timeout=10):
+        return 0, ""
+
+    def tap_screen(self, x, y):
+        if self.tap_latency:
+            time.sleep(self.tap_latency)
+        with self._lock:
+            self.taps.append((time.time(), x, y, self.current))
+            screen = self.screens.get(self.current)
+            next_name = screen.target(x, y) if screen is not None else None
+            if next_name == RESUME:
+                self.current, self._resume = self._resume, None
+            elif next_name is not None:
+                self.current = next_name
+                self._switches += 1
+                if self.popup_every and 'popup' in self.screens and self._switches % self.popup_every == 0:
+                    self._resume, self.current = self.current, 'popup'
+            elif self.advance == 'tap' and screen is not None and not screen.transitions:
+                self._step_sequence()
+
+    def tap_burst(self, x, y, times, interval=0):
+        """连续点击只在第一次点击时切换画面，其余点击视为落在同一位置的重复点击"""
+        start = time.time()
+        self.tap_screen(x, y)
+        if self.tap_latency:
+            time.sleep(self.tap_latency * (int(times) - 1))
+        return BurstResult(int(times), int(times), time.time() - start)
+
+    def _step_sequence(self):
+        index = self.order.index(self.current) + 1
+        if index >= len(self.order):
+            index = 0 if self.loop else len(self.order) - 1
+        self.current = self.order[index]
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def from_directory(path, **kwargs):
+        """
+        从图片目录加载画面，文件名排序即为画面顺序
+        目录中可选的 transitions.json: {"start": "a.png", "screens": {"a.png": [{"box": [x, y, w, h], "next": "b.png"}]}}
+        """
+        screens = {}
+        for image_path in sorted(glob.glob(os.path.join(path, '*.png'))):
+            image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            if image is not None:
+                screens[os.path.basename(image_path)] = FakeScreen(os.path.basename(image_path), image)
+        if not screens:
+            raise ValueError(f"目录中没有可用的画面: {path}")
+
+        start = next(iter(screens))
+        table_path = os.path.join(path, 'transitions.json')
+        if os.path.isfile(table_path):
+            with open(table_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            start = table.get('start', start)
+            for name, transitions in table.get('screens', {}).items():
+                screens[name].transitions = [Transition(tuple(t['box']), t['next']) for t in transitions]
+        return FakeAdbUtils(screens, start, **kwargs)
+
+    @staticmethod
+    def from_session(path, **kwargs):
+        """从 SessionRecorder 录制的会话加载画面，录制中的点击构成跳转表"""
+        from session_recorder import SessionReader
+        frames, table = SessionReader(path).replay_table()
+        if not frames:
+            raise ValueError(f"录制中没有可用的画面: {path}")
+        screens = {
+            name: FakeScreen(name, image, [Transition(tuple(t['box']), t['next']) for t in table.get(name, [])])
+            for name, image in frames
+        }
+        return FakeAdbUtils(screens, frames[0][0], **kwargs)
+
+    @staticmethod
+    def from_replay(path, **kwargs):
+        """按路径内容选择：含录制分段的目录按会话加载，否则按画面目录加载"""
+        if glob.glob(os.path.join(path, 'seg_*.bin')):
+            return FakeAdbUtils.from_session(path, **kwargs)
+        return FakeAdbUtils.from_directory(path, **kwargs)
+
+    @staticmethod
+    def from_plan(plan, resolution=(1280, 720), popup_every=0, seed=0, **kwargs):
+        """
+        按编译后的计划合成画面：主循环每一步一个画面，绘制该步骤的第一个目标，点中后进入下一步的画面
+        步骤有 loop_until_target 时该图绘制在下一步的画面上
+        :param popup_every: 每切换多少次画面插入一次辅助步骤的弹窗（0 为不插入），点击弹窗后回到原画面
+        """
+        width, height = resolution
+        rng = np.random.default_rng(seed)
+        # 带纹理的背景，避免纯色背景让匹配代价失真
+        background = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (9, 9), 0)
+
+        def place(image, path, slot):
+            template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            h, w = template.shape
+            x = 40 + (slot * 263) % max(1, width - w - 80)
+            y = 40 + (slot * 157) % max(1, height - h - 80)
+            image[y:y + h, x:x + w] = template
+            return (x, y, w, h)
+
+        steps = plan.main.steps
+        screens = {}
+        for i, step in enumerate(steps):
+            image = background.copy()
+            box = place(image, step.targets[0].path, i)
+            previous = steps[i - 1]
+            if previous.loop_until and previous.loop_until != step.targets[0].path:
+                place(image, previous.loop_until, i + len(steps))
+            name = f"main_{i}"
+            screens[name] = FakeScreen(name, image, [Transition(box, f"main_{(i + 1) % len(steps)}")])
+
+        if popup_every and plan.helpers:
+            image = background.copy()
+            box = place(image, plan.helpers[0].path, 0)
+            screens['popup'] = FakeScreen('popup', image, [Transition(box, RESUME)])
+
+        device = FakeAdbUtils(screens, 'main_0', **kwargs)
+        device.popup_every = popup_every
+        return device
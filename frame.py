@@ -0,0 +1,143 @@
+import time
+import struct
+import cv2
+import numpy as np
+
+# screencap 原始输出的像素格式 -> (每像素字节数, 转灰度的 cvtColor 代码)
+RAW_PIXEL_FORMATS = {
+    1: (4, cv2.COLOR_RGBA2GRAY),  # RGBA_8888
+    2: (4, cv2.COLOR_RGBA2GRAY),  # RGBX_8888
+    3: (3, cv2.COLOR_RGB2GRAY),   # RGB_888
+    5: (4, cv2.COLOR_BGRA2GRAY),  # BGRA_8888
+}
+
+
+class Frame:
+    """一次截图解码后的灰度帧，同一轮检测中的所有匹配共享这一份数据"""
+    __slots__ = ('image', 'timestamp', 'seq', 'scale', 'pyramid', 'thumbnail', 'histograms')
+
+    def __init__(self, image, timestamp=None, seq=0):
+        self.image = image
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # 由 FrameProvider 分配的帧序号，0 表示未经过 FrameProvider
+        self.seq = seq
+        # 缩放到模板分辨率时的 (x, y) 缩放比例，None 表示原始分辨率
+        self.scale = None
+        # 匹配时按需生成的下采样金字塔，同一帧内共享
+        self.pyramid = None
+        # 画面变化检测用的缩略图
+        self.thumbnail = None
+        # 模板预筛选用的搜索区域直方图 {roi: 直方图}
+        self.histograms = None
+
+    def resize_to(self, resolution):
+        """把帧缩放到模板制作时的分辨率 (width, height)，匹配坐标随后按 scale 换算回设备坐标"""
+        width, height = resolution
+        h, w = self.image.shape[:2]
+        if (w, h) == (width, height):
+            return
+        self.image = cv2.resize(self.image, (width, height), interpolation=cv2.INTER_AREA)
+        self.scale = (width / w, height / h)
+        self.pyramid = None
+        self.thumbnail = None
+        self.histograms = None
+
+    def get_thumbnail(self, size=(32, 18)):
+        """缩略图（区域平均），用于低成本比较两帧是否相同"""
+        if self.thumbnail is None or self.thumbnail.shape[::-1] != size:
+            self.thumbnail = cv2.resize(self.image, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+        return self.thumbnail
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @staticmethod
+    def from_png(data):
+        """PNG 字节直接在内存中解码为灰度图，失败返回 None"""
+        if not data:
+            return None
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return None
+        return Frame(image)
+
+    @staticmethod
+    def parse_raw_header(data):
+        """
+        解析 screencap（不带 -p）的头部
+        :return: (width, height, format, header_size)，无法识别返回 None
+        """
+        if not data or len(data) < 12:
+            return None
+        width, height, pixel_format = struct.unpack_from('<III', data, 0)
+        if pixel_format not in RAW_PIXEL_FORMATS or width == 0 or height == 0:
+            return None
+        bpp = RAW_PIXEL_FORMATS[pixel_format][0]
+        payload = width * height * bpp
+        # 旧版本头部 12 字节，Android 9 起追加 4 字节 dataspace
+        for header_size in (12, 16):
+            if len(data) == header_size + payload:
+                return width, height, pixel_format, header_size
+        return None
+
+    @staticmethod
+    def from_raw(data):
+        """原始帧缓冲直接转灰度：像素区以 ndarray 视图包装，不做拷贝"""
+        header = Frame.parse_raw_header(data)
+        if header is None:
+            return None
+        width, height, pixel_format, header_size = header
+        bpp, code = RAW_PIXEL_FORMATS[pixel_format]
+        pixels = np.frombuffer(data, np.uint8, count=width * height * bpp, offset=header_size)
+        image = cv2.cvtColor(pixels.reshape(height, width, bpp), code)
+        return Frame(image)
+
+
+class ChangeDetector:
+    """
+    比较当前帧与参考帧（上次判定为变化、即上次重新匹配时的帧）的缩略图
+    平均灰度差超过 tolerance，或任一格子的灰度差超过 cell_tolerance 即认为画面发生了变化
+    逐帧渐变不会因为每次只比较相邻两帧而漏掉；连续 max_skips 次未变化后强制判定一次变化
+    """
+
+    def __init__(self, tolerance=2.0, size=(64, 36), cell_tolerance=12, max_skips=5):
+        """
+        :param size: 缩略图尺寸，1280x720 时每格 20x20 像素，小图标出现也会使若干格子明显变化
+        :param max_skips: 连续判定未变化的上限，0 为不限
+        """
+        self.tolerance = tolerance
+        self.size = size
+        self.cell_tolerance = cell_tolerance
+        self.max_skips = max_skips
+        self._reference = None
+        self._skips = 0
+
+    def changed(self, frame):
+        thumbnail = frame.get_thumbnail(self.size)
+        reference = self._reference
+        if reference is None or reference.shape != thumbnail.shape or self._differs(reference, thumbnail):
+            self.mark(frame)
+            return True
+        self._skips += 1
+        if self.max_skips and self._skips >= self.max_skips:
+            self.mark(frame)
+            return True
+        return False
+
+    def mark(self, frame):
+        """把 frame 设为参考帧（调用方据此帧重新得出了结果）"""
+        self._reference = frame.get_thumbnail(self.size)
+        self._skips = 0
+
+    def _differs(self, reference, thumbnail):
+        diff = np.abs(thumbnail - reference)
+        return float(diff.mean()) > self.tolerance or int(diff.max()) > self.cell_tolerance
+
+    def reset(self):
+        self._reference = None
+        self._skips = 0
@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class FrameProvider:
+    """
+    帧共享：每帧只截图一次，打上时间戳和序号后分发给本轮所有检测器
+    检测器通过 max_age 声明可以接受多旧的帧
+    """
+
+    def __init__(self, adb_utils, max_age=0.5, reference_resolution=None, recorder=None, watchdog=None):
+        self.adb_utils = adb_utils
+        self.max_age = max_age
+        # 模板截取时的分辨率 (width, height)，设备分辨率不同时把帧映射到该尺寸
+        self.reference_resolution = reference_resolution
+        # 可选的 SessionRecorder，每次实际截图后入队录制
+        self.recorder = recorder
+        # 可选的 ConnectionWatchdog，截图连续失败时在此处重连，调用方只会看到一次较慢的截图
+        self.watchdog = watchdog
+        self.reconnects = 0
+        self.latest = None
+        self.seq = 0
+        self.captures = 0
+        self.reuses = 0
+        self._lock = threading.Lock()
+
+    def get(self, max_age=None):
+        """
+        获取一帧
+        :param max_age: 可接受的最大帧龄（秒），None 使用默认值，0 表示必须重新截图
+        :return: Frame，截图失败返回 None
+        """
+        if max_age is None:
+            max_age = self.max_age
+        with self._lock:
+            frame = self.latest
+            if frame is not None and frame.age <= max_age:
+                self.reuses += 1
+                return frame
+
+            start = time.time()
+            frame = self.adb_utils.take_screenshot()
+            if frame is None and self.watchdog is not None and self.watchdog.capture_failed():
+                self.reconnects += 1
+                start = time.time()
+                frame = self.adb_utils.take_screenshot()
+            if frame is None:
+                return None
+            if self.watchdog is not None:
+                self.watchdog.capture_ok()
+            if self.reference_resolution:
+                frame.resize_to(self.reference_resolution)
+            self.seq += 1
+            self.captures += 1
+            # 画面状态以发起截图的时刻为准；截图流的帧在此之前就已截取，保留其自身时刻
+            frame.timestamp = min(start, frame.timestamp)
+            frame.seq = self.seq
+            self.latest = frame
+            if self.recorder is not None:
+                self.recorder.record_frame(frame)
+            return frame
+
+    def invalidate(self):
+        """点击等操作后画面会变化，丢弃缓存的帧"""
+        with self._lock:
+            self.latest = None
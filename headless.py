@@ -0,0 +1,137 @@
+import argparse
+import logging
+import os
+import shutil
+import signal
+import sys
+import time
+from config_loader import ConfigLoader
+from fake_adb import FakeAdbUtils
+from log_utils import setup_logging
+from multi_device import MultiDeviceRunner
+
+logger = logging.getLogger(__name__)
+
+# 无界面运行入口：不导入 tkinter，可在 Linux 服务器上直接运行，收到 SIGINT/SIGTERM 时停止各设备并正常退出
+
+
+def resolve_adb_path(configured, override=None):
+    """
+    确定 adb 路径：命令行参数优先，其次配置中的路径；
+    配置中的路径在本机不存在时（例如 Windows 路径）退回 PATH 中的 adb
+    """
+    if override:
+        return override
+    if configured and os.path.isfile(configured):
+        return configured
+    return shutil.which('adb') or configured
+
+
+class HeadlessRunner:
+    """在一个进程内运行一个或多个配置，每个配置可驱动多台设备"""
+
+    def __init__(self, config_paths, adb_path=None, devices=None, match_workers=None, replay=None):
+        """
+        :param replay: 离线运行：画面目录、录制的会话目录，或 'synthetic' 按配置合成画面；此时不调用 adb
+        """
+        self.runners = []
+        for config_path in config_paths:
+            config = ConfigLoader.load(config_path)
+            self.runners.append(MultiDeviceRunner(
+                config_path,
+                devices,
+                adb_path=resolve_adb_path(config.get('adb_path'), adb_path),
+                match_workers=match_workers,
+                adb_factory=self._replay_factory(config, replay) if replay else None
+            ))
+        self._stopping = False
+
+    @staticmethod
+    def _replay_factory(config, replay):
+        if replay == 'synthetic':
+            plan = ConfigLoader.compile(config)
+            return lambda device: FakeAdbUtils.from_plan(plan, device_id=device)
+        return lambda device: FakeAdbUtils.from_replay(replay, device_id=device)
+
+    def start(self):
+        for runner in self.runners:
+            runner.start()
+
+    def stop(self):
+        self._stopping = True
+        for runner in self.runners:
+            runner.stop()
+
+    def is_alive(self):
+        return any(runner.is_alive() for runner in self.runners)
+
+    def status(self):
+        return [item for runner in self.runners for item in runner.status()]
+
+    def print_status(self):
+        for runner in self.runners:
+            runner.print_status()
+
+    def install_signal_handlers(self):
+        """第一次信号请求停止，等待当前步骤结束；再次收到信号时立即退出"""
+        def handle(signum, _frame):
+            if self._stopping:
+                logger.warning("再次收到退出信号，立即退出")
+                sys.exit(1)
+            logger.info(f"收到信号 {signum}，正在停止自动化任务...")
+            self.stop()
+
+        signal.signal(signal.SIGINT, handle)
+        if hasattr(signal, 'SIGTERM'):
+            signal.signal(signal.SIGTERM, handle)
+
+    def serve(self, status_interval=60):
+        """启动并阻塞到所有设备结束，返回退出码：全部正常结束为 0，否则为 1"""
+        self.install_signal_handlers()
+        self.start()
+        last_report = time.time()
+        while self.is_alive():
+            time.sleep(0.5)
+            if status_interval and time.time() - last_report >= status_interval:
+                self.print_status()
+                last_report = time.time()
+        self.print_status()
+        failed = [item for item in self.status() if item['status'] not in ('finished', 'stopped')]
+        return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面运行自动化任务")
+    parser.add_argument('configs', nargs='+', help="配置文件路径，可同时指定多个")
+    parser.add_argument('--adb', default=None, help="adb 路径，缺省读取配置，配置路径不存在时使用 PATH 中的 adb")
+    parser.add_argument('--device', action='append', default=None,
+                        help="设备序列号或 ip:port，可重复指定；缺省读取配置中的 devices")
+    parser.add_argument('--workers', type=int, default=None, help="模板匹配线程数")
+    parser.add_argument('--replay', default=None,
+                        help="离线运行：画面目录（可含 transitions.json）、录制的会话目录，或 synthetic 按配置合成画面")
+    parser.add_argument('--status-interval', type=float, default=60, help="状态输出间隔(秒)，0 为不输出")
+    parser.add_argument('--log-level', default=None, help="日志级别，缺省读取第一个配置的 log_level")
+    parser.add_argument('--log-file', default=None, help="日志文件（按大小轮转），缺省读取第一个配置的 log_file")
+    args = parser.parse_args(argv)
+
+    # 日志设置取自第一个配置，命令行参数优先
+    try:
+        log_config = dict(ConfigLoader.load(args.configs[0]))
+    except Exception:
+        log_config = {}  # 配置本身的错误在下面初始化时报告
+    if args.log_level:
+        log_config['log_level'] = args.log_level
+    if args.log_file:
+        log_config['log_file'] = args.log_file
+    setup_logging(log_config)
+
+    try:
+        runner = HeadlessRunner(args.configs, args.adb, args.device, args.workers, args.replay)
+    except Exception as e:
+        logger.error(f"初始化失败: {str(e)}")
+        return 2
+    return runner.serve(args.status_interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
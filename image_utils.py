@@ -1,68 +1,403 @@
+import logging
 import cv2
+import numpy as np
 import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 单个模板的匹配结果：最高分与目标中心坐标（低于阈值时 pos 为 None）
+MatchResult = namedtuple('MatchResult', ['score', 'pos'])
+
+# 金字塔匹配：先在缩小的图像上粗定位，再在原分辨率候选区域内精确匹配
+PYRAMID_LEVELS = 2     # 最多下采样层数，每层边长减半
+MIN_COARSE_SIZE = 12   # 粗匹配层模板的最小边长，过小时粗匹配分数不可靠
+
+# 直方图预筛选：模板出现在搜索区域内时，其每一级灰度的像素都包含在区域的同级像素中
+# 包含率 = Σ min(模板直方图, 区域直方图) / 模板像素数，低于下限的模板不做 matchTemplate
+# 区域直方图每一级取相邻 spread 级中的最大值，容忍缩放、压缩与轻微亮度变化带来的灰度偏移
+PREFILTER_BINS = 16
+
+
+class RoiCache:
+    """学习型搜索区域：优先在模板上次命中位置附近的窗口内匹配，未命中再回退到完整搜索区域"""
+
+    def __init__(self, padding=40):
+        self.padding = padding
+        self.hits = 0
+        self.misses = 0
+        self._last = {}  # 模板路径 -> 上次命中的 (x, y, w, h)
+        self._lock = threading.Lock()
+
+    def window(self, template_path, region=None):
+        """
+        上次命中位置外扩 padding 的窗口
+        :param region: 配置的搜索区域 (x, y, w, h)，窗口裁剪到该区域内，不在区域外命中
+        :return: (x, y, w, h)，没有记录或与区域不相交时返回 None
+        """
+        last = self._last.get(template_path)
+        if last is None:
+            return None
+        x, y, w, h = last
+        p = self.padding
+        left, top, right, bottom = x - p, y - p, x + w + p, y + h + p
+        if region:
+            rx, ry, rw, rh = region
+            left, top = max(left, rx), max(top, ry)
+            right, bottom = min(right, rx + rw), min(bottom, ry + rh)
+            if right <= left or bottom <= top:
+                return None
+        return (left, top, right - left, bottom - top)
+
+    def record(self, template_path, box, window_hit=None):
+        """记录命中位置；window_hit 为窗口匹配结果（True/False），None 表示未使用窗口"""
+        with self._lock:
+            if window_hit is True:
+                self.hits += 1
+            elif window_hit is False:
+                self.misses += 1
+            if box is not None:
+                self._last[template_path] = box
+
+    def forget(self, template_path):
+        """模板被替换后尺寸可能变化，丢弃其记录的位置"""
+        with self._lock:
+            self._last.pop(template_path, None)
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"搜索区域缓存: 命中 {self.hits} 次，未命中 {self.misses} 次 ({rate:.1f}%)"
 
 class ImageUtils:
+    # 模板缓存为进程内共享的只读数据，多设备同时运行时只加载一份
     _template_cache = {}  # 静态字典缓存模板图像
+    _pyramid_cache = {}   # 模板路径 -> 下采样层列表 [1/2, 1/4, ...]
+    _histogram_cache = {}  # 模板路径 -> PREFILTER_BINS 级灰度直方图（像素数）
+    # 预筛选的最低包含率，0 为关闭（默认）；prefilter_verify 为 True 时被排除的模板仍完整匹配，用于统计误判
+    # 原始灰度直方图会随亮度变化，而 TM_CCOEFF_NORMED 不受亮度缩放影响，遮罩变暗的目标会被误判为未出现
+    _prefilter_ratio = 0.0
+    _prefilter_spread = 1
+    prefilter_verify = False
+    _preload_lock = threading.Lock()
+    # 批量匹配线程池：cv2.matchTemplate 执行时会释放 GIL，可多核并行
+    # 所有设备共用这一个线程池；_match_slots 限制包括调用线程在内同时进行的匹配数，CPU 占用随 worker 数量可控
+    _executor = None
+    _match_slots = None
+    _max_workers = min(8, os.cpu_count() or 1)
+
+    @staticmethod
+    def set_max_workers(max_workers):
+        """设置同时进行的匹配数（线程池大小），需在首次匹配之前调用"""
+        if ImageUtils._executor is not None:
+            logger.warning("匹配线程池已启动，worker 数量设置不生效")
+            return
+        ImageUtils._max_workers = max(1, int(max_workers))
+
+    @staticmethod
+    def set_prefilter(ratio, spread=1):
+        """
+        设置直方图预筛选
+        :param ratio: 最低包含率，0 为关闭
+        :param spread: 容忍的灰度级偏移（每级 256 / PREFILTER_BINS）
+        """
+        ImageUtils._prefilter_ratio = max(0.0, float(ratio))
+        ImageUtils._prefilter_spread = max(0, int(spread))
+
+    @staticmethod
+    def preload_templates(template_paths, store=None):
+        """
+        预加载模板图像，template_paths 通常取自编译后计划的模板表
+        :param store: 可选的 TemplateStore，从预处理包内存映射加载，省去逐张解码
+        """
+        with ImageUtils._preload_lock:
+            for path in template_paths:
+                if path not in ImageUtils._template_cache:
+                    ImageUtils._load_template(path, store)
+
+    @staticmethod
+    def reload_templates(template_paths, store=None):
+        """重新加载已变化的模板，逐个替换缓存条目，正在进行的匹配不受影响"""
+        with ImageUtils._preload_lock:
+            for path in template_paths:
+                ImageUtils._load_template(path, store)
+
+    @staticmethod
+    def _load_template(path, store):
+        if store is not None:
+            loaded = store.load(path, ImageUtils.build_pyramid)
+        else:
+            template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            loaded = (template, ImageUtils.build_pyramid(template)) if template is not None else None
+        if loaded is None:
+            logger.warning(f"无法加载模板图像 {path}")
+            return
+        template, levels = loaded
+        ImageUtils._pyramid_cache[path] = levels
+        ImageUtils._histogram_cache[path] = ImageUtils.histogram(template)
+        ImageUtils._template_cache[path] = template
 
     @staticmethod
-    def preload_templates(config):
-        """预加载所有配置中的模板图像"""
-        # 收集所有需要预加载的图像路径
-        all_images = set()
-        
-        # 主步骤中的目标图像
-        for step in config.get("steps", []):
-            for target in step.get("targets", []):
-                all_images.add(target['path'])
-        
-        # 辅助步骤中的触发图像
-        for helper in config.get("helper_steps", {}).values():
-            if 'trigger_image' in helper:
-                all_images.add(helper['trigger_image'])
-        
-        #循环退出条件图像
-        if 'loop' in config and 'exit_condition' in config['loop']:
-            exit_target = config['loop']['exit_condition'].get('target')
-            if exit_target:
-                all_images.add(exit_target)
-        
-        # 全局监听和子循环图像
-        if 'global_monitor' in config:
-            all_images.add(config['global_monitor']['trigger_image'])
-            for step in config['global_monitor']['target_loop']['steps']:
-                for target in step.get('targets', []):
-                    all_images.add(target['path'])
-        
-        # 加载到缓存
-        for path in all_images:
-            if path not in ImageUtils._template_cache:
-                template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-                if template is not None:
-                    ImageUtils._template_cache[path] = template
-                else:
-                    print(f"警告: 无法加载模板图像 {path}")
-
-    @staticmethod
-    def find_image(screen_path, template_path, threshold=0.8):
-        screen = cv2.imread(screen_path, cv2.IMREAD_GRAYSCALE)
+    def histogram(image):
+        return cv2.calcHist([image], [0], None, [PREFILTER_BINS], [0, 256]).ravel()
+
+    @staticmethod
+    def _histograms(screen):
+        """帧上缓存的搜索区域直方图 {roi: 直方图}，同一帧的所有匹配共用；预筛选关闭时返回 None"""
+        if ImageUtils._prefilter_ratio <= 0:
+            return None
+        histograms = getattr(screen, 'histograms', None)
+        if histograms is None:
+            histograms = {}
+            if hasattr(screen, 'histograms'):
+                screen.histograms = histograms
+        return histograms
+
+    @staticmethod
+    def _plausible(screen, template_path, roi, histograms):
+        """直方图预筛选，返回模板是否可能出现在搜索区域内"""
+        template_hist = ImageUtils._histogram_cache.get(template_path)
+        if template_hist is None:
+            return True
+        region_hist = histograms.get(roi)
+        if region_hist is None:
+            region = screen
+            if roi:
+                x, y, w, h = roi
+                region = screen[max(0, y):y + h, max(0, x):x + w]
+            region_hist = ImageUtils.histogram(region) if region.size else np.zeros(PREFILTER_BINS, np.float32)
+            spread = ImageUtils._prefilter_spread
+            if spread:
+                padded = np.pad(region_hist, spread)
+                region_hist = np.max([padded[i:i + PREFILTER_BINS] for i in range(2 * spread + 1)], axis=0)
+            histograms[roi] = region_hist
+        contained = float(np.minimum(template_hist, region_hist).sum())
+        return contained >= ImageUtils._prefilter_ratio * float(template_hist.sum())
+
+    @staticmethod
+    def build_pyramid(template):
+        """模板预处理为下采样层，边长小于 MIN_COARSE_SIZE 的层不再生成"""
+        levels = []
+        image = template
+        for _ in range(PYRAMID_LEVELS):
+            image = cv2.pyrDown(image)
+            if min(image.shape) < MIN_COARSE_SIZE:
+                break
+            levels.append(image)
+        return levels
+
+    @staticmethod
+    def _screen_pyramid(screen):
+        """
+        取出屏幕图像金字塔 [原图, 1/2, 1/4, ...]：支持 Frame、ndarray 以及图片路径
+        Frame 上会缓存结果，同一帧的多次匹配只下采样一次
+        """
         if screen is None:
             return None
-        
+        if isinstance(screen, str):
+            screen = cv2.imread(screen, cv2.IMREAD_GRAYSCALE)
+            if screen is None:
+                return None
+        pyramid = getattr(screen, 'pyramid', None)
+        if pyramid:
+            return pyramid
+
+        image = getattr(screen, 'image', screen)
+        pyramid = [image]
+        for _ in range(PYRAMID_LEVELS):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+        if hasattr(screen, 'pyramid'):
+            screen.pyramid = pyramid
+        return pyramid
+
+    @staticmethod
+    def _to_device(screen, result):
+        """帧被缩放到模板分辨率时，把坐标换算回设备坐标"""
+        scale = getattr(screen, 'scale', None)
+        if not scale or result is None or result.pos is None:
+            return result
+        sx, sy = scale
+        return MatchResult(result.score, (int(result.pos[0] / sx), int(result.pos[1] / sy)))
+
+    @staticmethod
+    def find_image(screen, template_path, threshold=0.8, roi=None, roi_cache=None):
+        pyramid = ImageUtils._screen_pyramid(screen)
+        if pyramid is None:
+            return None
+        result = ImageUtils._match(
+            pyramid, template_path, threshold, roi, roi_cache, ImageUtils._histograms(screen)
+        )
+        return ImageUtils._to_device(screen, result).pos
+
+    @staticmethod
+    def find_images(screen, entries, any_mode=False, roi_cache=None):
+        """
+        在同一帧上批量匹配多个模板
+        :param entries: [(template_path, threshold, roi), ...]，roi 为 (x, y, w, h) 或 None
+        :param any_mode: 按顺序取第一个命中项，命中后其后尚未开始的匹配直接取消
+        :param roi_cache: 可选的 RoiCache，先在上次命中位置附近搜索
+        :return: 与 entries 一一对应的 MatchResult 列表，被取消的项为 None
+        """
+        results = [None] * len(entries)
+        if not entries:
+            return results
+        pyramid = ImageUtils._screen_pyramid(screen)
+        if pyramid is None:
+            return results
+        histograms = ImageUtils._histograms(screen)
+        if len(entries) == 1:
+            results[0] = ImageUtils._to_device(
+                screen, ImageUtils._match(pyramid, *entries[0], roi_cache, histograms)
+            )
+            return results
+
+        executor = ImageUtils._get_executor()
+        futures = {
+            executor.submit(ImageUtils._match, pyramid, *entry, roi_cache, histograms): i
+            for i, entry in enumerate(entries)
+        }
+        first_hit = len(entries)
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            i = futures[future]
+            results[i] = future.result()
+            if any_mode and results[i].pos is not None and i < first_hit:
+                first_hit = i
+                for other, j in futures.items():
+                    if j > i:
+                        other.cancel()
+        return [ImageUtils._to_device(screen, result) for result in results]
+
+    @staticmethod
+    def _get_executor():
+        if ImageUtils._executor is None:
+            with ImageUtils._preload_lock:
+                if ImageUtils._executor is None:
+                    # OpenCV 内部并行线程按 worker 数量分摊，总线程数不超过 CPU 核数
+                    cv2.setNumThreads(max(1, (os.cpu_count() or 1) // ImageUtils._max_workers))
+                    ImageUtils._match_slots = threading.BoundedSemaphore(ImageUtils._max_workers)
+                    ImageUtils._executor = ThreadPoolExecutor(
+                        max_workers=ImageUtils._max_workers,
+                        thread_name_prefix='match'
+                    )
+        return ImageUtils._executor
+
+    @staticmethod
+    def _get_slots():
+        ImageUtils._get_executor()
+        return ImageUtils._match_slots
+
+    @staticmethod
+    def _match(pyramid, template_path, threshold=0.8, roi=None, roi_cache=None, histograms=None):
+        # 调用线程上直接匹配（单个模板、各设备与中断检测线程）同样占用一个名额，总并发不超过 worker 数量
+        with ImageUtils._get_slots():
+            start = time.perf_counter()
+            # 按模板统计匹配耗时与分数，用于调整阈值与搜索区域；模板为各设备共用，不区分设备
+            name = os.path.basename(template_path)
+            if histograms is not None and not ImageUtils._plausible(pyramid[0], template_path, roi, histograms):
+                metrics.incr('prefilter_skips', template=name, device=None)
+                if not ImageUtils.prefilter_verify:
+                    metrics.observe('match_seconds', time.perf_counter() - start, template=name, device=None)
+                    return MatchResult(0.0, None)
+                result = ImageUtils._match_template(pyramid, template_path, threshold, roi, roi_cache)
+                if result.pos is not None:
+                    metrics.incr('prefilter_false_rejects', template=name, device=None)
+                    logger.warning(f"预筛选误判 [{name}]: 完整匹配分数 {result.score:.3f}")
+                return result
+            result = ImageUtils._match_template(pyramid, template_path, threshold, roi, roi_cache)
+            metrics.observe('match_seconds', time.perf_counter() - start, template=name, device=None)
+            metrics.observe('match_score', result.score, template=name, device=None)
+            return result
+
+    @staticmethod
+    def _match_template(pyramid, template_path, threshold, roi, roi_cache):
         # 从缓存获取模板图像
         template = ImageUtils._template_cache.get(template_path)
         if template is None:
-            print(f"错误: 模板图像 {template_path} 未预加载")
-            return None
-        
+            logger.error(f"模板图像 {template_path} 未预加载")
+            return MatchResult(0.0, None)
+
+        screen = pyramid[0]
+        window = roi_cache.window(template_path, roi) if roi_cache else None
+        if window is not None:
+            result = ImageUtils._match_region(screen, template, threshold, window)
+            roi_cache.record(template_path, None, window_hit=result.pos is not None)
+            if result.pos is not None:
+                ImageUtils._report(template_path, result.score, threshold)
+                return result
+
+        result = ImageUtils._match_coarse_to_fine(
+            pyramid, template, ImageUtils._pyramid_cache.get(template_path, []), threshold, roi
+        )
+        ImageUtils._report(template_path, result.score, threshold)
+        if roi_cache and result.pos is not None:
+            h, w = template.shape
+            roi_cache.record(template_path, (result.pos[0] - w // 2, result.pos[1] - h // 2, w, h))
+        return result
+
+    @staticmethod
+    def _match_coarse_to_fine(pyramid, template, template_levels, threshold, roi=None):
+        """在最粗的可用层上找出最佳候选位置，只在原分辨率下精修该候选附近的小窗口"""
+        screen = pyramid[0]
+        x, y, w, h = roi if roi else (0, 0, screen.shape[1], screen.shape[0])
+        x, y = max(0, x), max(0, y)
+        w, h = min(w, screen.shape[1] - x), min(h, screen.shape[0] - y)
+        th, tw = template.shape
+
+        level = min(len(template_levels), len(pyramid) - 1)
+        # 搜索区域与模板尺寸相近时粗匹配不划算，直接全分辨率匹配
+        if level == 0 or w * h < 4 * tw * th:
+            return ImageUtils._match_region(screen, template, threshold, roi)
+
+        factor = 2 ** level
+        coarse_x, coarse_y = x // factor, y // factor
+        coarse_screen = pyramid[level][coarse_y:(y + h) // factor, coarse_x:(x + w) // factor]
+        coarse_template = template_levels[level - 1]
+        if (coarse_screen.shape[0] < coarse_template.shape[0]
+                or coarse_screen.shape[1] < coarse_template.shape[1]):
+            return ImageUtils._match_region(screen, template, threshold, roi)
+
+        result = cv2.matchTemplate(coarse_screen, coarse_template, cv2.TM_CCOEFF_NORMED)
+        _, _, _, max_loc = cv2.minMaxLoc(result)
+
+        # 候选位置映射回原分辨率，外扩一个粗层像素的量化误差后精修
+        margin = 2 * factor
+        left = max(x, (coarse_x + max_loc[0]) * factor - margin)
+        top = max(y, (coarse_y + max_loc[1]) * factor - margin)
+        right = min(x + w, left + tw + 2 * margin)
+        bottom = min(y + h, top + th + 2 * margin)
+        return ImageUtils._match_region(screen, template, threshold, (left, top, right - left, bottom - top))
+
+    @staticmethod
+    def _match_region(screen, template, threshold, roi=None):
+        """在 roi (x, y, w, h) 范围内匹配，返回坐标已换算回整帧"""
+        offset_x, offset_y = 0, 0
+        if roi:
+            x, y, w, h = roi
+            offset_x, offset_y = max(0, x), max(0, y)
+            screen = screen[offset_y:y + h, offset_x:x + w]
+
+        h, w = template.shape
+        if screen.shape[0] < h or screen.shape[1] < w:
+            return MatchResult(0.0, None)
+
         result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
         _, max_val, _, max_loc = cv2.minMaxLoc(result)
-        
-        print(f"匹配值: {max_val:.3f} (阈值: {threshold})")
-        
+
         if max_val < threshold:
-            return None
-        
-        h, w = template.shape
-        x = max_loc[0] + w // 2
-        y = max_loc[1] + h // 2
-        return (x, y)
\ No newline at end of file
+            return MatchResult(max_val, None)
+
+        x = offset_x + max_loc[0] + w // 2
+        y = offset_y + max_loc[1] + h // 2
+        return MatchResult(max_val, (x, y))
+
+    @staticmethod
+    def _report(template_path, score, threshold):
+        # 每次匹配都会调用，关闭 DEBUG 时不做任何格式化
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("匹配值: %.3f (阈值: %s) [%s]", score, threshold, os.path.basename(template_path))
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from image_utils import ImageUtils
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 中断：kind 为 exit / monitor / helper，node 为对应的 ConditionNode 或 HelperNode，frame 为检测到中断的帧
+Interrupt = namedtuple('Interrupt', ['kind', 'node', 'position', 'frame'])
+
+# 优先级从高到低：退出条件 > 全局监听 > 辅助弹窗；同一帧上同时出现时只报告优先级最高的一个
+PRIORITY = ('exit', 'monitor', 'helper')
+
+
+class InterruptWatcher:
+    """
+    后台线程持续在最新帧上检测退出条件、全局监听触发图与辅助弹窗
+    检测到中断后置位 event，StepRunner 在下一个取消点（轮询开始前、等待中）返回，由 AutomationCore 处理后从原步骤继续
+    已下发的点击不会被打断
+    平时只检测主循环已截取的帧，不额外截图；只有 StepRunner 在较长的 post_delay 等待中时才自行截图
+    """
+
+    def __init__(self, frame_provider, plan, roi_cache=None, interval=0.3):
+        self.frames = frame_provider
+        self.roi_cache = roi_cache
+        self.interval = interval
+        self.event = threading.Event()
+        self.checks = 0
+        self._pending = None
+        self._ignore_before = 0.0
+        self._scope = ()
+        self._capturing = False
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.set_plan(plan)
+
+    def set_plan(self, plan):
+        """按优先级排列检测项（配置热更新后重新调用）"""
+        nodes = []
+        if plan.main.exit is not None:
+            nodes.append(('exit', plan.main.exit))
+        if plan.monitor is not None and plan.sub is not None:
+            nodes.append(('monitor', plan.monitor))
+        nodes.extend(('helper', helper) for helper in plan.helpers)
+        self._nodes = nodes
+
+    def set_scope(self, kinds):
+        """设置当前需要检测的中断类型；子循环中与原先一致，不做任何检测"""
+        with self._lock:
+            self._scope = tuple(kinds)
+            if self._pending is not None and self._pending.kind not in self._scope:
+                self._pending = None
+                self.event.clear()
+
+    def start(self, **labels):
+        """:param labels: 本线程记录指标时绑定的标签（如 device）"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(labels,), name='interrupts', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(self.interval * 4 + 1)
+            self._thread = None
+
+    def begin_wait(self, seconds):
+        """StepRunner 开始固定等待：超过两个检测间隔时等待期间由本线程自行截图"""
+        self._capturing = seconds > self.interval * 2
+
+    def end_wait(self):
+        self._capturing = False
+
+    def pending(self):
+        return self._pending
+
+    def take(self):
+        """取出待处理的中断并清除标志，没有时返回 None"""
+        with self._lock:
+            interrupt, self._pending = self._pending, None
+            self.event.clear()
+            return interrupt
+
+    def resume(self):
+        """中断处理完毕：此前截取的帧上画面尚未更新，忽略这些帧上的检测结果"""
+        with self._lock:
+            self._ignore_before = time.time()
+            self._pending = None
+            self.event.clear()
+
+    def _run(self, labels):
+        metrics.bind(**labels)
+        last_seq = None
+        while not self._stopped.is_set():
+            scope = self._scope
+            nodes = [(kind, node) for kind, node in self._nodes if kind in scope]
+            if not nodes or self._pending is not None:
+                self._stopped.wait(self.interval)
+                continue
+            # 只检测主循环截取的帧，不与步骤轮询争用 adb；主循环长时间等待时才自行截图
+            frame = self.frames.get(self.interval) if self._capturing else self.frames.latest
+            if frame is None or frame.seq == last_seq or frame.timestamp < self._ignore_before:
+                self._stopped.wait(self.interval / 2)
+                continue
+            last_seq = frame.seq
+            self._check(frame, nodes)
+            self._stopped.wait(self.interval / 2)
+
+    def _check(self, frame, nodes):
+        entries = [
+            (node.path, node.threshold, node.region)
+            for _, node in nodes
+        ]
+        self.checks += 1
+        # 按优先级顺序的 any 模式：高优先级命中时其后的匹配直接取消
+        results = ImageUtils.find_images(frame, entries, any_mode=True, roi_cache=self.roi_cache)
+        for (kind, node), result in zip(nodes, results):
+            if result is not None and result.pos is not None:
+                self._raise(Interrupt(kind, node, result.pos, frame))
+                return
+
+    def _raise(self, interrupt):
+        with self._lock:
+            if interrupt.kind not in self._scope or interrupt.frame.timestamp < self._ignore_before:
+                return
+            self._pending = interrupt
+            self.event.set()
+        metrics.incr('interrupts', kind=interrupt.kind)
+        logger.info(f"检测到中断 [{interrupt.kind}] {interrupt.node.path}")
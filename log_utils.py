@@ -0,0 +1,131 @@
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+from collections import deque
+
+# 日志统一经 logging 输出：匹配值、单次点击等高频信息为 DEBUG，默认不显示
+# 入口（界面 / headless / 多设备）调用 setup_logging 配置根 logger，各模块只需 logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s [%(threadName)s] %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+
+class RateLimitFilter(logging.Filter):
+    """相同内容的日志在 interval 秒内最多输出 burst 次，之后的重复被省略，下一个时间窗口输出时附带省略条数"""
+
+    def __init__(self, interval=5.0, burst=3, max_keys=1024):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        self._seen = {}  # (logger, 消息) -> [窗口开始时间, 窗口内输出次数, 省略条数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.interval <= 0 or record.levelno >= logging.ERROR:
+            return True
+        # 多个 handler 共用同一过滤器，同一条记录只判定一次
+        decision = getattr(record, '_rate_limit_pass', None)
+        if decision is not None:
+            return decision
+        record._rate_limit_pass = self._check(record)
+        return record._rate_limit_pass
+
+    def _check(self, record):
+        key = (record.name, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is not None and now - state[0] < self.interval:
+                if state[1] >= self.burst:
+                    state[2] += 1
+                    return False
+                state[1] += 1
+                return True
+            if state is not None and state[2]:
+                record.msg = f"{record.getMessage()} (已省略 {state[2]} 条重复消息)"
+                record.args = None
+            if len(self._seen) >= self.max_keys:
+                # 只保留最近的一半，避免内容各异的消息使字典无限增长
+                for old in sorted(self._seen, key=lambda k: self._seen[k][0])[:self.max_keys // 2]:
+                    del self._seen[old]
+            self._seen[key] = [now, 1, 0]
+        return True
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    有上限的日志缓冲：界面线程定时 drain 批量取出
+    界面来不及刷新时只保留最新的 max_lines 条，不会无限占用内存
+    """
+
+    def __init__(self, max_lines=2000):
+        super().__init__()
+        self.max_lines = max_lines
+        self._lines = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._buffer_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._buffer_lock:
+            if len(self._lines) == self._lines.maxlen:
+                self._dropped += 1
+            self._lines.append(line)
+
+    def drain(self):
+        """
+        取出并清空缓冲
+        :return: (日志行列表, 因缓冲已满被丢弃的条数)
+        """
+        with self._buffer_lock:
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped, self._dropped = self._dropped, 0
+        return lines, dropped
+
+
+_installed = []
+
+
+def setup_logging(config=None, handlers=(), console=True):
+    """
+    配置根 logger，可重复调用（先移除上次安装的 handler）
+    :param config: 配置字典，读取 log_level / log_file / log_max_bytes / log_backup_count / log_rate_limit / log_rate_burst
+    :param handlers: 额外的 handler，例如界面的 RingBufferHandler
+    :param console: 是否输出到 stderr
+    """
+    config = config or {}
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+        handler.close()
+    _installed.clear()
+
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    rate_limit = RateLimitFilter(config.get('log_rate_limit', 5.0), config.get('log_rate_burst', 3))
+    targets = list(handlers)
+    if console:
+        targets.append(logging.StreamHandler(sys.__stderr__))
+    log_file = config.get('log_file')
+    if log_file:
+        targets.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=config.get('log_max_bytes', 5 * 1024 * 1024),
+            backupCount=config.get('log_backup_count', 3),
+            encoding='utf-8'
+        ))
+
+    for handler in targets:
+        handler.setFormatter(formatter)
+        # 每个 handler 共用同一个限流器，保证各输出内容一致
+        handler.addFilter(rate_limit)
+        root.addHandler(handler)
+        _installed.append(handler)
+    root.setLevel(str(config.get('log_level', 'INFO')).upper())
@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 运行指标：各阶段耗时、匹配分数与计数
+# 进程内共用一个 metrics 实例；设备线程通过 bind 绑定 device 标签，之后在该线程记录的数据自动带上
+
+
+def percentile(values, q):
+    """values 需已排序，q 取 0~1，线性插值"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class Series:
+    """单个指标的样本：总数与总和完整累计，分位数取最近 window 个样本"""
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+
+class Metrics:
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window=5000):
+        self.window = window
+        self.series = {}    # (名称, 标签元组) -> Series
+        self.counters = {}  # (名称, 标签元组) -> int
+        self.gauges = {}    # (名称, 标签元组) -> float
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace = None
+        self._trace_path = None
+
+    def configure(self, trace_path=None):
+        """设置 JSONL 追踪文件，每条记录一行；多次调用同一路径时只打开一次"""
+        with self._lock:
+            if trace_path == self._trace_path:
+                return
+            if self._trace is not None:
+                self._trace.close()
+            self._trace_path = trace_path
+            self._trace = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+
+    def bind(self, **labels):
+        """为当前线程绑定默认标签（如 device）"""
+        self._local.labels = labels
+
+    def _key(self, name, labels):
+        """合并线程绑定的标签；值为 None 的标签表示不区分该维度"""
+        bound = getattr(self._local, 'labels', None)
+        if bound:
+            labels = {**bound, **labels}
+        return name, tuple(sorted((k, v) for k, v in labels.items() if v is not None))
+
+    def observe(self, name, value, **labels):
+        """记录一个样本（耗时单位为秒）"""
+        key = self._key(name, labels)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = Series(self.window)
+            series.add(value)
+            self._write_trace('observe', key, value)
+
+    def incr(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._write_trace('incr', key, amount)
+
+    def set_gauge(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _write_trace(self, kind, key, value):
+        if self._trace is None:
+            return
+        name, labels = key
+        self._trace.write(json.dumps(
+            {"t": round(time.time(), 4), "kind": kind, "name": name, "labels": dict(labels), "value": value},
+            ensure_ascii=False
+        ) + "\n")
+
+    def flush(self):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.flush()
+
+    def summary(self, device=None):
+        """
+        各耗时指标的分位数汇总
+        :param device: 只输出该设备的指标以及不区分设备的指标（如模板匹配）
+        """
+        lines = []
+        with self._lock:
+            items = [(key, sorted(series.samples), series.count) for key, series in self.series.items()]
+        for (name, labels), samples, count in sorted(items):
+            label_map = dict(labels)
+            if device is not None and label_map.get('device', device) != device:
+                continue
+            label_text = ",".join(f"{k}={v}" for k, v in labels if k != 'device')
+            p50, p90, p99 = (percentile(samples, q) for q in self.QUANTILES)
+            if name.endswith('_seconds'):
+                values = f"p50 {p50 * 1000:.1f}ms p90 {p90 * 1000:.1f}ms p99 {p99 * 1000:.1f}ms max {samples[-1] * 1000:.1f}ms"
+            else:
+                values = f"p50 {p50:.3f} p90 {p90:.3f} p99 {p99:.3f} max {samples[-1]:.3f}"
+            lines.append(f"{name}{{{label_text}}} n={count} {values}")
+        return lines
+
+    def write_prometheus(self, path):
+        """以 Prometheus 文本格式写出全部指标（先写临时文件再替换，读取方不会读到半个文件）"""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                f'{k}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                for k, v in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self._lock:
+            series_items = [(key, sorted(s.samples), s.count, s.total) for key, s in self.series.items()]
+            counter_items = list(self.counters.items())
+            gauge_items = list(self.gauges.items())
+
+        declared = set()
+        for (name, labels), samples, count, total in sorted(series_items):
+            metric = f"nama_{name}"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} summary")
+                declared.add(metric)
+            for q in self.QUANTILES:
+                lines.append(f"{metric}{fmt_labels(labels, [('quantile', q)])} {percentile(samples, q):.6f}")
+            lines.append(f"{metric}_sum{fmt_labels(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{fmt_labels(labels)} {count}")
+        for (name, labels), value in sorted(counter_items):
+            metric = f"nama_{name}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{fmt_labels(labels)} {value}")
+        for (name, labels), value in sorted(gauge_items):
+            metric = f"nama_{name}"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} gauge")
+                declared.add(metric)
+            lines.append(f"{metric}{fmt_labels(labels)} {value:.6f}")
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self.series.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.started = time.time()
+
+
+metrics = Metrics()
@@ -0,0 +1,127 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from automation_core import AutomationCore
+from config_loader import ConfigLoader
+from image_utils import ImageUtils
+from log_utils import setup_logging
+from template_store import TemplateStore
+
+logger = logging.getLogger(__name__)
+
+
+class MultiDeviceRunner:
+    """在一个进程内驱动多台模拟器：每台设备一个独立的 AutomationCore 循环，模板与匹配线程池共享"""
+
+    def __init__(self, config_path, devices=None, adb_path=None, match_workers=None, adb_factory=None):
+        """
+        :param adb_factory: 可选，按设备序列号创建设备对象的函数（离线回放时返回 FakeAdbUtils）
+        """
+        config = ConfigLoader.load(config_path)
+        ConfigLoader.validate(config)
+        self.config_path = config_path
+        self.adb_path = adb_path or config['adb_path']
+        # 设备列表：参数优先，其次配置中的 devices，最后退回 adb_ip:adb_port
+        self.devices = list(devices or config.get('devices') or [
+            f"{config['adb_ip']}:{config.get('adb_port', 16384)}"
+        ])
+        self.adb_ip = config['adb_ip']
+        self.adb_port = config.get('adb_port', 16384)
+
+        workers = match_workers or config.get('match_workers')
+        if workers:
+            ImageUtils.set_max_workers(workers)
+        # 启动前统一预加载，各设备之后只读共享
+        store = None
+        if config.get('template_pack', True):
+            store = TemplateStore.shared(config.get('template_pack_dir', os.path.join('image', '.pack')))
+        ImageUtils.preload_templates(ConfigLoader.compile(config).templates.paths, store)
+
+        self.adb_factory = adb_factory
+        self.cores = {}
+        self.threads = {}
+        self.errors = {}
+        self._stopped = False
+
+    def start(self):
+        for device in self.devices:
+            thread = threading.Thread(
+                target=self._run_device,
+                args=(device,),
+                name=f"device-{device}",
+                daemon=True
+            )
+            self.threads[device] = thread
+            thread.start()
+
+    def _run_device(self, device):
+        try:
+            adb_utils = self.adb_factory(device) if self.adb_factory else None
+            core = AutomationCore(
+                self.config_path, self.adb_path, self.adb_ip, self.adb_port, device, adb_utils=adb_utils
+            )
+        except Exception as e:
+            self.errors[device] = str(e)
+            logger.error(f"[{device}] 初始化失败: {str(e)}")
+            return
+        self.cores[device] = core
+        if self._stopped:
+            # 初始化期间已请求停止
+            core.running = False
+        core.run()
+
+    def stop(self):
+        self._stopped = True
+        for core in list(self.cores.values()):
+            core.running = False
+
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self.threads.values())
+
+    def wait(self, timeout=None):
+        for thread in self.threads.values():
+            thread.join(timeout)
+
+    def status(self):
+        """各设备的状态与计数"""
+        result = []
+        for device in self.devices:
+            core = self.cores.get(device)
+            if core is not None:
+                result.append(core.stats())
+            elif device in self.errors:
+                result.append({"device": device, "status": "failed", "error": self.errors[device]})
+            else:
+                result.append({"device": device, "status": "starting"})
+        return result
+
+    def print_status(self):
+        for item in self.status():
+            counters = ", ".join(f"{k}={v}" for k, v in item.items() if k not in ("device", "status"))
+            logger.info(f"[{item['device']}] {item['status']} {counters}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多设备运行")
+    parser.add_argument('config', help="配置文件路径")
+    parser.add_argument('devices', nargs='*', help="设备序列号或 ip:port，缺省读取配置中的 devices")
+    parser.add_argument('--workers', type=int, default=None, help="模板匹配线程数")
+    parser.add_argument('--status-interval', type=float, default=60, help="状态输出间隔(秒)")
+    args = parser.parse_args()
+
+    setup_logging(ConfigLoader.load(args.config))
+    runner = MultiDeviceRunner(args.config, args.devices, match_workers=args.workers)
+    runner.start()
+    try:
+        last_report = time.time()
+        while runner.is_alive():
+            time.sleep(1)
+            if time.time() - last_report >= args.status_interval:
+                runner.print_status()
+                last_report = time.time()
+    except KeyboardInterrupt:
+        runner.stop()
+        runner.wait()
+    runner.print_status()
@@ -0,0 +1,185 @@
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+# 编译后的执行计划：配置只在加载时解释一次，运行期只读取这些不可变的节点
+# 模板统一登记在 TemplateTable 中去重，节点与模板缓存均以路径为键
+
+TargetNode = namedtuple('TargetNode', [
+    'path', 'name', 'threshold', 'offset', 'priority', 'region'
+])
+
+# entries 为预先展开的批量匹配参数 [(path, threshold, region), ...]，有 loop_until 时其位于首位
+StepNode = namedtuple('StepNode', [
+    'description', 'targets', 'any', 'loop_until', 'click_times', 'click_interval',
+    'post_delay', 'timeout', 'settle', 'entries'
+])
+
+HelperNode = namedtuple('HelperNode', [
+    'name', 'description', 'path', 'threshold', 'region', 'post_delay', 'settle'
+])
+
+# 退出条件与全局监听触发图
+ConditionNode = namedtuple('ConditionNode', ['path', 'threshold', 'region', 'max_frame_age'])
+
+LoopPlan = namedtuple('LoopPlan', ['kind', 'steps', 'exit'])
+
+# 界面索引条目：模板属于哪个界面，由 compile_plan 汇总配置中出现的所有模板生成
+# kind: main / sub 为主循环、子循环步骤（index 为步骤下标），helper 为辅助步骤（index 为名称），
+# monitor 为全局监听，exit / sub_exit 为退出条件
+ScreenEntry = namedtuple('ScreenEntry', ['path', 'threshold', 'region', 'kind', 'index'])
+
+Plan = namedtuple('Plan', [
+    'main', 'sub', 'helpers', 'monitor', 'templates', 'max_loops', 'transitions', 'screen_index'
+])
+
+# 主循环与子循环之间的跳转：全局监听命中后进入子循环第 0 步，子循环结束后回到主循环第 0 步
+DEFAULT_TRANSITIONS = {
+    'monitor': ('sub', 0),
+    'sub_end': ('main', 0),
+}
+
+
+class TemplateTable:
+    """去重后的模板路径表，按首次出现的顺序排列"""
+    __slots__ = ('paths', '_seen')
+
+    def __init__(self):
+        self.paths = []
+        self._seen = set()
+
+    def add(self, path):
+        if path not in self._seen:
+            self._seen.add(path)
+            self.paths.append(path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def missing(self):
+        return [path for path in self.paths if not os.path.isfile(path)]
+
+
+def _region(value):
+    return tuple(value) if value else None
+
+
+def _settle(value, default, post_delay):
+    """settle 解析为 (stable, timeout)，关闭时为 None"""
+    if value is None:
+        value = default
+    if value is True:
+        value = {}
+    if not value:
+        return None
+    return (value.get('stable', 0.3), value.get('timeout', post_delay * 3))
+
+
+def compile_plan(config):
+    """
+    把配置字典编译为 Plan，整个配置树只遍历一次
+    :raises ValueError: 引用的模板文件不存在
+    """
+    table = TemplateTable()
+    screen_index = []
+    default_settle = config.get('settle')
+
+    def condition(path, threshold, region, max_frame_age, kind, index=None):
+        if not path:
+            return None
+        table.add(path)
+        screen_index.append(ScreenEntry(path, threshold, _region(region), kind, index))
+        return ConditionNode(path, threshold, _region(region), max_frame_age)
+
+    def compile_steps(steps, kind):
+        nodes = []
+        for i, step in enumerate(steps):
+            targets = []
+            for target in step.get('targets', []):
+                path = target['path']
+                table.add(path)
+                threshold = target.get('threshold', 0.8)
+                region = _region(target.get('region'))
+                targets.append(TargetNode(
+                    path, os.path.basename(path), threshold,
+                    tuple(target.get('offset', (0, 0))), target.get('priority', 0), region
+                ))
+                screen_index.append(ScreenEntry(path, threshold, region, kind, i))
+
+            entries = [(t.path, t.threshold, t.region) for t in targets]
+            loop_until = step.get('loop_until_target')
+            if loop_until:
+                table.add(loop_until)
+                until_threshold = step.get('loop_until_threshold', 0.8)
+                until_region = _region(step.get('loop_until_region'))
+                entries.insert(0, (loop_until, until_threshold, until_region))
+                # 出现 loop_until_target 说明该步骤已完成，界面归属下一步
+                screen_index.append(ScreenEntry(
+                    loop_until, until_threshold, until_region, kind, (i + 1) % len(steps)
+                ))
+
+            post_delay = step.get('post_delay', 1)
+            nodes.append(StepNode(
+                step.get('description', ''),
+                tuple(targets),
+                step.get('any', False),
+                loop_until,
+                step.get('click_times', 1),
+                step.get('click_interval', 0),
+                post_delay,
+                step.get('timeout', 60),
+                _settle(step.get('settle'), default_settle, post_delay),
+                tuple(entries)
+            ))
+        return tuple(nodes)
+
+    loop_config = config.get('loop', {})
+    exit_config = loop_config.get('exit_condition') or {}
+    main = LoopPlan('main', compile_steps(config.get('steps', []), 'main'), condition(
+        exit_config.get('target'), exit_config.get('threshold', 0.8),
+        exit_config.get('region'), exit_config.get('max_frame_age'), 'exit'
+    ))
+
+    helpers = []
+    for name, helper in config.get('helper_steps', {}).items():
+        path = helper.get('trigger_image')
+        if not path:
+            continue
+        table.add(path)
+        threshold = helper.get('threshold', 0.8)
+        region = _region(helper.get('region'))
+        step = helper.get('step', {})
+        post_delay = step.get('post_delay', 1)
+        helpers.append(HelperNode(
+            name, helper.get('description', name), path, threshold, region,
+            post_delay, _settle(step.get('settle'), default_settle, post_delay)
+        ))
+        screen_index.append(ScreenEntry(path, threshold, region, 'helper', name))
+
+    monitor, sub = None, None
+    if 'global_monitor' in config:
+        monitor_config = config['global_monitor']
+        monitor = condition(
+            monitor_config.get('trigger_image'), monitor_config.get('threshold', 0.8),
+            monitor_config.get('region'), monitor_config.get('max_frame_age'), 'monitor'
+        )
+        target_loop = monitor_config.get('target_loop', {})
+        sub_exit = target_loop.get('exit_condition') or {}
+        sub = LoopPlan('sub', compile_steps(target_loop.get('steps', []), 'sub'), condition(
+            sub_exit.get('target'), sub_exit.get('threshold', 0.6),
+            sub_exit.get('region'), sub_exit.get('max_frame_age'), 'sub_exit'
+        ))
+
+    max_loops = 0
+    if loop_config.get('enabled', False):
+        loop_type = loop_config.get('type', 'times')
+        max_loops = float('inf') if loop_type == 'infinite' else loop_config.get('times', 1)
+
+    missing = table.missing()
+    if missing:
+        raise ValueError(f"模板图像不存在: {', '.join(missing)}")
+
+    return Plan(
+        main, sub, tuple(helpers), monitor, table, max_loops,
+        MappingProxyType(dict(DEFAULT_TRANSITIONS)), tuple(screen_index)
+    )
@@ -0,0 +1,71 @@
+from collections import namedtuple
+from image_utils import ImageUtils
+
+# 识别结果：命中的模板、分数，以及该模板所属的全部界面 [(kind, index), ...]
+ScreenMatch = namedtuple('ScreenMatch', ['path', 'score', 'owners'])
+
+
+class ScreenClassifier:
+    """一次批量匹配识别当前界面，用于在步骤走偏后直接跳到对应步骤"""
+
+    def __init__(self, screen_index, roi_cache=None):
+        self.roi_cache = roi_cache
+        # 相同 (模板, 阈值, 区域) 只匹配一次，结果映射回所有归属界面
+        self.entries = []
+        self.owners = []
+        positions = {}
+        for item in screen_index:
+            key = (item.path, item.threshold, item.region)
+            if key not in positions:
+                positions[key] = len(self.entries)
+                self.entries.append(key)
+                self.owners.append([])
+            owner = (item.kind, item.index)
+            if owner not in self.owners[positions[key]]:
+                self.owners[positions[key]].append(owner)
+
+    def classify(self, frame):
+        """返回分数最高的命中界面，没有任何模板命中时返回 None"""
+        results = ImageUtils.find_images(frame, self.entries, roi_cache=self.roi_cache)
+        best = None
+        for entry, owners, result in zip(self.entries, self.owners, results):
+            if result is None or result.pos is None:
+                continue
+            if best is None or result.score > best.score:
+                best = ScreenMatch(entry[0], result.score, owners)
+        return best
+
+    @staticmethod
+    def distance(current, target, length):
+        """循环内两步之间的距离，返回 (步数, 是否向后回退)，距离相同时优先向前"""
+        forward = (target - current) % length
+        backward = (current - target) % length
+        return (forward, False) if forward <= backward else (backward, True)
+
+    @staticmethod
+    def resolve(match, kind, current, length):
+        """
+        根据识别结果决定跳转位置
+        :param kind: 当前所在循环 main / sub
+        :param current: 当前步骤下标
+        :param length: 当前循环的步骤数
+        :return: (kind, index)；kind 为 monitor / exit 时 index 为 None；无需跳转返回 None
+        """
+        kinds = [owner[0] for owner in match.owners]
+        if 'exit' in kinds and kind == 'main':
+            return ('exit', None)
+        if 'monitor' in kinds and kind == 'main':
+            return ('monitor', None)
+
+        # 优先同一循环内离当前步骤最近的一步（循环回绕）：漏点时回到前一步重试，弹窗跳过时向后
+        same = [index for owner_kind, index in match.owners if owner_kind == kind]
+        if same:
+            if current in same:
+                return None
+            return (kind, min(same, key=lambda i: ScreenClassifier.distance(current, i, length)))
+        for owner_kind, index in match.owners:
+            if owner_kind in ('main', 'sub'):
+                return (owner_kind, index)
+        if kind == 'sub' and 'sub_exit' in kinds:
+            return ('main', 0)
+        return None
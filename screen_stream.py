@@ -0,0 +1,171 @@
+import argparse
+import glob
+import logging
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from adb_shell import CREATE_NO_WINDOW
+from frame import Frame, RAW_PIXEL_FORMATS
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 设备端在同一个 exec-out 会话中循环执行 screencap，输出为连续的 <头部, 像素> 原始帧
+STREAM_SCRIPT = "while true; do screencap; done"
+
+
+class ScreenStream:
+    """
+    连续截图流：后台线程从常驻进程的输出中逐帧读取并解码，只保留最新一帧
+    没有被取走就被新帧覆盖的帧直接丢弃
+    """
+
+    def __init__(self, command, header_size=16, timeout=5):
+        """
+        :param command: 启动输出流的命令，如 adb exec-out <STREAM_SCRIPT>
+        :param header_size: 每帧头部字节数，旧版 Android 为 12，Android 9 起为 16
+        :param timeout: 等待新帧的最长时间(秒)，超时视为截图失败
+        """
+        self.command = command
+        self.header_size = header_size
+        self.timeout = timeout
+        self.frames = 0
+        self.dropped = 0
+        self._latest = None
+        self._taken = True
+        self._ended = False
+        self._cond = threading.Condition()
+        self._proc = None
+        self._thread = None
+
+    def start(self):
+        self._ended = False
+        self._proc = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=CREATE_NO_WINDOW
+        )
+        self._thread = threading.Thread(
+            target=self._read_loop, args=(self._proc.stdout,), name='screen-stream', daemon=True
+        )
+        self._thread.start()
+
+    def is_alive(self):
+        return self._proc is not None and not self._ended
+
+    def take(self, after=0.0):
+        """
+        取最新的一帧，每帧只返回一次；槽位中没有合适的帧时等待下一帧
+        :param after: 只接受截图时刻不早于该时间的帧（如最近一次点击完成的时刻）
+        :return: Frame，timeout 秒内没有新帧或输出流已结束返回 None
+        """
+        deadline = time.time() + self.timeout
+        with self._cond:
+            while True:
+                frame = self._latest
+                if frame is not None and not self._taken and frame.timestamp >= after:
+                    self._taken = True
+                    return frame
+                remaining = deadline - time.time()
+                if self._ended or remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def close(self):
+        # 先结束进程让读取线程从阻塞的 read 中返回，再关闭管道
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+        if self._thread is not None:
+            self._thread.join(self.timeout)
+            self._thread = None
+        if self._proc is not None:
+            self._proc.wait()
+            self._proc.stdout.close()
+            self._proc = None
+
+    def _read_loop(self, stream):
+        # 设备端上一帧写完后才开始下一次 screencap，以读完上一帧的时刻作为下一帧的截图时刻
+        started = time.time()
+        try:
+            while True:
+                header = self._read_exact(stream, self.header_size)
+                if header is None:
+                    break
+                width, height, pixel_format = struct.unpack_from('<III', header, 0)
+                if pixel_format not in RAW_PIXEL_FORMATS or width == 0 or height == 0:
+                    logger.warning(f"截图流帧头无法识别: {width}x{height} 格式 {pixel_format}")
+                    break
+                bpp, code = RAW_PIXEL_FORMATS[pixel_format]
+                data = self._read_exact(stream, width * height * bpp)
+                if data is None:
+                    break
+                finished = time.time()
+                image = cv2.cvtColor(np.frombuffer(data, np.uint8).reshape(height, width, bpp), code)
+                metrics.observe('stream_frame_seconds', finished - started)
+                frame = Frame(image, timestamp=started)
+                started = finished
+                with self._cond:
+                    if not self._taken:
+                        self.dropped += 1
+                    self._latest = frame
+                    self._taken = False
+                    self.frames += 1
+                    self._cond.notify_all()
+        except (OSError, ValueError) as e:
+            logger.warning(f"截图流读取失败: {str(e)}")
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+            logger.info(f"截图流已结束，共 {self.frames} 帧，未取用 {self.dropped} 帧")
+
+    @staticmethod
+    def _read_exact(stream, size):
+        data = stream.read(size)
+        if len(data) < size:
+            return None
+        return data
+
+
+def serve_fake(path, fps=30, header_size=16):
+    """
+    本地替身截图流：把目录中的 PNG 按文件名顺序循环写成 screencap 原始帧（RGBA）到标准输出
+    用于不连接设备时测试 ScreenStream
+    """
+    images = []
+    for image_path in sorted(glob.glob(os.path.join(path, '*.png'))):
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGBA))
+    if not images:
+        raise ValueError(f"目录中没有可用的画面: {path}")
+    out = sys.stdout.buffer
+    index = 0
+    while True:
+        image = images[index % len(images)]
+        height, width = image.shape[:2]
+        header = struct.pack('<III', width, height, 1) + b'\0' * (header_size - 12)
+        try:
+            out.write(header)
+            out.write(image.tobytes())
+            out.flush()
+        except (BrokenPipeError, OSError):
+            return
+        index += 1
+        if fps:
+            time.sleep(1 / fps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="截图流工具")
+    parser.add_argument('--fake', required=True, help="把画面目录写成原始截图流输出，用于本地测试")
+    parser.add_argument('--fps', type=float, default=30, help="替身截图流的帧率，0 为不限")
+    parser.add_argument('--header-size', type=int, default=16, help="帧头字节数 (12 或 16)")
+    args = parser.parse_args()
+    serve_fake(args.fake, args.fps, args.header_size)
@@ -0,0 +1,260 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 会话录制：截图帧（PNG 无损压缩）、当前步骤、匹配分数与点击按时间顺序追加写入分段文件
+# 每条记录为 <元数据长度, 数据长度> 两个 uint32 + JSON 元数据 + 数据；进程中断时最后一条不完整的记录在读取时忽略
+# 总大小超过上限时删除最早的分段
+
+RECORD_HEADER = struct.Struct('<II')
+SEGMENT_PATTERN = 'seg_*.bin'
+
+
+class SessionRecorder:
+    """后台线程写入的会话录制器，record_* 方法只入队，不会阻塞自动化循环"""
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, segment_bytes=16 * 1024 * 1024, queue_size=64,
+                 queue_bytes=64 * 1024 * 1024):
+        """
+        :param queue_size: 待写入记录数上限
+        :param queue_bytes: 待写入帧的总字节数上限（未压缩，1280x720 灰度帧约 0.9 MB），超出时丢弃新帧
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        os.makedirs(path, exist_ok=True)
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.queue_bytes = queue_bytes
+        self._queued_bytes = 0
+        self._bytes_lock = threading.Lock()
+        self._segment = None
+        self._segment_index = 0
+        self._last_image = None
+        self._last_seq = None
+        self._last_segment = None  # 上一张完整帧所在的分段序号
+        self._thread = threading.Thread(target=self._write_loop, name='recorder', daemon=True)
+        self._thread.start()
+
+    def _put(self, item, size=0):
+        # 写入跟不上时丢弃，宁可少录也不拖慢自动化
+        with self._bytes_lock:
+            if size and self._queued_bytes + size > self.queue_bytes:
+                self.dropped += 1
+                return
+            self._queued_bytes += size
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            self._release(size)
+
+    def _release(self, size):
+        if size:
+            with self._bytes_lock:
+                self._queued_bytes -= size
+
+    def record_frame(self, frame):
+        self._put(('frame', {"t": frame.timestamp, "seq": frame.seq, "scale": frame.scale}, frame.image),
+                  frame.image.nbytes)
+
+    def record_event(self, kind, **fields):
+        """记录步骤、分数、点击等事件，fields 需可 JSON 序列化"""
+        self._put((kind, dict(fields, t=time.time()), None))
+
+    def close(self, timeout=5):
+        # 结束标记不能丢：队列满时等待写入线程腾出位置
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"会话录制 {timeout} 秒内未写完，放弃剩余记录")
+            return
+        self._thread.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            kind, meta, image = item
+            try:
+                self._write(kind, meta, image)
+            except Exception as e:
+                logger.warning(f"会话录制写入失败: {str(e)}")
+            finally:
+                self._release(image.nbytes if image is not None else 0)
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _write(self, kind, meta, image):
+        payload = b''
+        meta['kind'] = kind
+        if image is not None:
+            # 与上一帧完全相同时只记录引用，静止画面不重复占用空间
+            if self._last_image is not None and np.array_equal(image, self._last_image):
+                meta['same_as'] = self._last_seq
+            else:
+                payload = self._encode(image)
+                if payload is None:
+                    return
+
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        segment = self._current_segment(RECORD_HEADER.size + len(meta_bytes) + len(payload))
+        if 'same_as' in meta and self._last_segment != self._segment_index:
+            # 新分段从完整帧开始，最早的分段被删除后仍可独立读取
+            del meta['same_as']
+            payload = self._encode(image)
+            if payload is None:
+                return
+            meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        if payload:
+            self._last_image = image
+            self._last_seq = meta['seq']
+            self._last_segment = self._segment_index
+        segment.write(RECORD_HEADER.pack(len(meta_bytes), len(payload)))
+        segment.write(meta_bytes)
+        segment.write(payload)
+        segment.flush()
+        self.written += 1
+
+    def _current_segment(self, size):
+        if self._segment is not None and self._segment.tell() + size > self.segment_bytes:
+            self._segment.close()
+            self._segment = None
+        if self._segment is None:
+            self._segment_index += 1
+            self._segment = open(os.path.join(self.path, f"seg_{self._segment_index:06d}.bin"), 'ab')
+            self._evict()
+        return self._segment
+
+    @staticmethod
+    def _encode(image):
+        ok, encoded = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+        return encoded.tobytes() if ok else None
+
+    def _evict(self):
+        segments = sorted(glob.glob(os.path.join(self.path, SEGMENT_PATTERN)))
+        total = sum(os.path.getsize(p) for p in segments)
+        # 当前分段不删除
+        for path in segments[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+            self.evicted += 1
+
+
+class SessionReader:
+    """按时间顺序读取录制的会话"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def records(self):
+        """逐条返回 (元数据, 数据字节)"""
+        for segment in sorted(glob.glob(os.path.join(self.path, SEGMENT_PATTERN))):
+            with open(segment, 'rb') as f:
+                while True:
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    meta_size, payload_size = RECORD_HEADER.unpack(header)
+                    meta_bytes = f.read(meta_size)
+                    payload = f.read(payload_size)
+                    if len(meta_bytes) < meta_size or len(payload) < payload_size:
+                        break  # 中断时写了一半的记录
+                    yield json.loads(meta_bytes.decode('utf-8')), payload
+
+    def frames(self):
+        """
+        逐帧返回 (元数据, 灰度图)，引用上一帧的记录还原为同一张图
+        :return: 生成器
+        """
+        images = {}
+        for meta, payload in self.records():
+            if meta['kind'] != 'frame':
+                continue
+            if payload:
+                image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_GRAYSCALE)
+                images = {meta['seq']: image}
+            else:
+                image = images.get(meta.get('same_as'))
+                if image is None:
+                    continue  # 被引用的帧所在分段已被删除
+            yield meta, image
+
+    def replay_table(self):
+        """
+        整理为回放用的画面表：去重后的帧按顺序命名，点击位置附近的区域跳转到点击后第一张不同的帧
+        :return: ([(画面名, 灰度图), ...], {画面名: [{"box": [x, y, w, h], "next": 画面名}, ...]})
+        """
+        screens = []
+        transitions = {}
+        pending_tap = None
+        scale = None
+        for meta, payload in self.records():
+            if meta['kind'] == 'tap':
+                pending_tap = meta
+                continue
+            if meta['kind'] != 'frame' or not payload:
+                continue
+            image = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_GRAYSCALE)
+            name = f"frame_{len(screens):05d}.png"
+            if pending_tap is not None and screens:
+                # 点击记录的是设备坐标，帧被缩放过时换算到帧坐标
+                x, y = pending_tap['x'], pending_tap['y']
+                if scale:
+                    x, y = int(x * scale[0]), int(y * scale[1])
+                transitions.setdefault(screens[-1][0], []).append({"box": [x - 30, y - 30, 60, 60], "next": name})
+            pending_tap = None
+            scale = meta.get('scale')
+            screens.append((name, image))
+        return screens, transitions
+
+    def export(self, out_dir):
+        """
+        导出为画面目录（PNG + transitions.json），可直接用于 FakeAdbUtils.from_directory
+        :return: 导出的画面数
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        screens, transitions = self.replay_table()
+        for name, image in screens:
+            cv2.imwrite(os.path.join(out_dir, name), image)
+        if screens:
+            with open(os.path.join(out_dir, 'transitions.json'), 'w', encoding='utf-8') as f:
+                json.dump({"start": screens[0][0], "screens": transitions}, f, indent=2)
+        logger.info(f"导出 {len(screens)} 帧到 {out_dir}")
+        return len(screens)
+
+
+if __name__ == "__main__":
+    from log_utils import setup_logging
+
+    parser = argparse.ArgumentParser(description="会话录制查看与导出")
+    parser.add_argument('session', help="录制目录")
+    parser.add_argument('--export', default=None, help="导出为画面目录（PNG + transitions.json）")
+    args = parser.parse_args()
+
+    setup_logging()
+    reader = SessionReader(args.session)
+    if args.export:
+        reader.export(args.export)
+    else:
+        counts = {}
+        for meta, _ in reader.records():
+            counts[meta['kind']] = counts.get(meta['kind'], 0) + 1
+        for kind, count in sorted(counts.items()):
+            print(f"{kind}: {count}")
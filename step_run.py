@@ -1,93 +1,292 @@
+import logging
 import time
 import os
 from image_utils import ImageUtils
+from frame import ChangeDetector
+from frame_provider import FrameProvider
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SettleStats:
+    """按步骤统计点击后画面实际稳定所用的时间"""
+
+    def __init__(self):
+        self.records = {}  # 步骤描述 -> [(耗时, 是否在上限内稳定), ...]
+
+    def record(self, name, elapsed, settled):
+        self.records.setdefault(name, []).append((elapsed, settled))
+
+    def summary(self):
+        lines = []
+        for name, records in self.records.items():
+            times = [elapsed for elapsed, _ in records]
+            capped = sum(1 for _, settled in records if not settled)
+            lines.append(
+                f"[{name}] 等待 {len(times)} 次，平均 {sum(times) / len(times):.2f} 秒，"
+                f"最长 {max(times):.2f} 秒，达到上限 {capped} 次"
+            )
+        return lines
+
 
 class StepRunner:
-    def __init__(self, config, adb_utils, check_interval=2):
-        self.config = config
+    def __init__(self, loop_plan, adb_utils, check_interval=2, frame_provider=None, roi_cache=None,
+                 min_check_interval=0.2, change_tolerance=2.0, settle_stats=None,
+                 classifier=None, recover_after=30, helpers=(), is_running=None, recorder=None,
+                 interrupts=None, on_burst=None):
+        """
+        :param loop_plan: 编译后的 LoopPlan（主循环或子循环）
+        :param helpers: 每次轮询都要检测的辅助步骤 HelperNode 列表
+        :param is_running: 返回是否继续运行的函数，停止后当前步骤在下一次轮询时返回
+        :param recorder: 可选的 SessionRecorder，记录步骤、匹配分数与点击
+        :param interrupts: 可选的 InterruptWatcher，检测到中断后当前步骤在下一次轮询前或等待中返回 False
+        :param on_burst: 连续点击至少送达一次后调用 on_burst(kind, index)，用于记录检查点
+        """
         self.adb_utils = adb_utils
+        # 轮询间隔在 [min_check_interval, check_interval] 之间自适应：点击后最快，画面静止时逐步放慢
         self.check_interval = check_interval
-        self.steps = config.get("steps", [])
-
-    def check_and_run_helpers(self):
-        helpers = self.config.get("helper_steps", {})
-        for name, helper in helpers.items():
-            trigger_image = helper.get("trigger_image")
-            threshold = helper.get("threshold", 0.8)
-            if not trigger_image:
+        self.min_check_interval = min(min_check_interval, check_interval)
+        self.frames = frame_provider or FrameProvider(adb_utils)
+        self.roi_cache = roi_cache
+        self.change_detector = ChangeDetector(change_tolerance)
+        self.settle_stats = settle_stats or SettleStats()
+        # 界面识别：持续 recover_after 秒找不到目标时识别当前界面，属于其他步骤则交给调用方跳转
+        self.classifier = classifier
+        self.recover_after = recover_after
+        self.redirect = None
+        self.kind = loop_plan.kind
+        self.steps = loop_plan.steps
+        self.helpers = tuple(helpers)
+        self._helper_entries = tuple((h.path, h.threshold, h.region) for h in self.helpers)
+        self.is_running = is_running or (lambda: True)
+        self.recorder = recorder
+        self.interrupts = interrupts
+        self.on_burst = on_burst
+
+    def label(self, step, index):
+        """指标标签：描述在配置中会重复（如多次“购买”），带上循环与下标区分"""
+        if index is None:
+            return step.description
+        return f"{self.kind}[{index}] {step.description}".rstrip()
+
+    def interrupted(self):
+        return self.interrupts is not None and self.interrupts.event.is_set()
+
+    def _sleep(self, seconds):
+        """可被中断打断的等待，返回是否等满"""
+        if self.interrupts is None:
+            time.sleep(seconds)
+            return True
+        return not self.interrupts.event.wait(seconds)
+
+    def run_helper(self, helper, position, frame):
+        """点击辅助触发图并等待画面变化"""
+        logger.info(f"检测到辅助触发图 [{helper.path}]，点击触发图像位置 {position}，执行辅助步骤 [{helper.name}]")
+        if self.recorder:
+            self.recorder.record_event('tap', x=position[0], y=position[1], times=1, helper=helper.name)
+        self.adb_utils.tap_screen(*position)
+        self.frames.invalidate()
+        self.wait_after_tap(frame, helper, f"helper:{helper.name}")
+
+    def check_and_run_helpers(self, frame):
+        """检测并执行辅助步骤，返回是否有辅助步骤被触发"""
+        if not self.helpers:
+            return False
+        fired = False
+        results = ImageUtils.find_images(frame, self._helper_entries, roi_cache=self.roi_cache)
+        for helper, result in zip(self.helpers, results):
+            if result.pos:
+                self.run_helper(helper, result.pos, frame)
+                fired = True
+        return fired
+
+    def wait_after_tap(self, reference, node, name):
+        """
+        点击后的等待：配置了 settle 时等画面变化并稳定下来（有上限），否则固定 sleep(post_delay)
+        :param reference: 点击前的帧
+        :param node: StepNode 或 HelperNode
+        :param name: 指标与等待统计中的步骤标签
+        """
+        if node.settle is None:
+            start = time.time()
+            if self.interrupts is not None:
+                self.interrupts.begin_wait(node.post_delay)
+            try:
+                self._sleep(node.post_delay)
+            finally:
+                if self.interrupts is not None:
+                    self.interrupts.end_wait()
+            # 被中断打断时实际等待少于 post_delay
+            metrics.observe('wait_seconds', time.time() - start, mode='post_delay', step=name)
+            return
+        stable_time, timeout = node.settle
+        elapsed, settled = self.wait_until_settled(reference, stable_time, timeout, node.post_delay)
+        self.settle_stats.record(name, elapsed, settled)
+        metrics.observe('wait_seconds', elapsed, mode='settle', step=name)
+        if not settled and not self.interrupted():
+            logger.info(f"画面未在 {elapsed:.2f} 秒内稳定，继续执行")
+
+    def wait_until_settled(self, reference, stable_time, timeout, quiet=None):
+        """
+        等待画面相对 reference 发生变化，之后连续 stable_time 秒不再变化
+        :param quiet: 超过该秒数画面仍未变化时视为点击没有引起界面变化，直接返回，None 为等到 timeout
+        :return: (耗时, 是否在 timeout 内稳定)
+        """
+        start = time.time()
+        # 稳定判断不能强制判定变化，否则永远等不到稳定
+        detector = ChangeDetector(self.change_detector.tolerance, max_skips=0)
+        detector.mark(reference)
+        last_change = None
+        while time.time() - start < timeout:
+            if not self._sleep(self.min_check_interval):
+                break
+            frame = self.frames.get(0)
+            if frame is None:
                 continue
+            if detector.changed(frame):
+                last_change = frame.timestamp
+            elif last_change is not None and frame.timestamp - last_change >= stable_time:
+                return time.time() - start, True
+            elif last_change is None and quiet is not None and time.time() - start >= quiet:
+                return time.time() - start, True
+        return time.time() - start, False
 
-            position = ImageUtils.find_image('screen.png', trigger_image, threshold)
-            if position:
-                print(f"检测到辅助触发图 [{trigger_image}]，点击触发图像位置 {position}，执行辅助步骤 [{name}]")
-                self.adb_utils.tap_screen(*position)
-                time.sleep(helper.get("step", {}).get("post_delay", 1))
+    def run_step(self, step, index=None):
+        """
+        执行单个步骤
+        :param step: StepNode
+        :param index: 该步骤在所属循环中的下标，用于走偏后识别界面
+        :return: 完成返回 True；超时、被中断或识别到其他界面返回 False，后者的识别结果保存在 self.redirect
+        """
+        start = time.perf_counter()
+        success = self._run_step(step, index)
+        if success:
+            result = 'ok'
+        elif not self.is_running():
+            result = 'stopped'
+        elif self.interrupted():
+            result = 'interrupted'
+        else:
+            result = 'redirect' if self.redirect else 'timeout'
+        name = self.label(step, index)
+        metrics.observe('step_seconds', time.perf_counter() - start, kind=self.kind, step=name)
+        metrics.incr('steps', kind=self.kind, step=name, result=result)
+        return success
 
-    def run_step(self, step_config):
-        print(f"正在执行步骤: {step_config.get('description', '')}")
+    def _run_step(self, step, index):
+        logger.info(f"正在执行步骤: {step.description}")
+        if self.recorder:
+            self.recorder.record_event('step', loop=self.kind, index=index, description=step.description)
         start_time = time.time()
-        any_mode = step_config.get('any', False)
-        loop_until_target = step_config.get('loop_until_target', None)
+        last_progress = start_time
+        self.redirect = None
+        owner = (self.kind, index) if index is not None else None
+        first_poll = True
+        interval = self.min_check_interval
+        cached_results = None
+        self.change_detector.reset()
+        reconnects = self.frames.reconnects
 
-        while True:
-            if not self.adb_utils.take_screenshot():
-                time.sleep(self.check_interval)
+        while self.is_running():
+            # 取消点：中断只在轮询之间与等待中生效，已下发的点击不会被打断
+            if self.interrupted():
+                return False
+            # 首轮可复用本 tick 内全局监听/退出检测已截取的帧，之后的轮询都重新截图
+            frame = self.frames.get(None if first_poll else 0)
+            first_poll = False
+            if self.frames.reconnects != reconnects:
+                # 设备断开重连：中断时间不计入步骤超时，画面从头判断
+                reconnects = self.frames.reconnects
+                start_time = last_progress = time.time()
+                cached_results = None
+                self.change_detector.reset()
+            if frame is None:
+                if time.time() - start_time > step.timeout:
+                    logger.warning("步骤超时")
+                    return False
+                self._sleep(self.check_interval)
                 continue
 
-            self.check_and_run_helpers()
+            if self.change_detector.changed(frame) or cached_results is None:
+                self.change_detector.mark(frame)
+                helper_fired = self.check_and_run_helpers(frame)
+                # 退出标志图与所有目标在同一批次中并行匹配
+                results = ImageUtils.find_images(frame, step.entries, step.any, self.roi_cache)
+                # 辅助步骤点击后画面必然变化，本次结果不能复用
+                cached_results = None if helper_fired else results
+                interval = self.min_check_interval
+                metrics.incr('polls', result='matched')
+                if self.recorder:
+                    self.recorder.record_event('scores', seq=frame.seq, scores=[
+                        [os.path.basename(entry[0]), round(float(result.score), 4)]
+                        for entry, result in zip(step.entries, results) if result is not None
+                    ])
+            else:
+                # 画面未变化：跳过全部匹配，沿用上次结果，并逐步放慢轮询
+                results = cached_results
+                interval = min(interval * 1.5, self.check_interval)
+                metrics.incr('polls', result='unchanged')
 
-            if loop_until_target:
-                if ImageUtils.find_image('screen.png', loop_until_target, 0.8):
-                    print(f"检测到退出标志图片 [{loop_until_target}]，进入下一步骤")
+            if step.loop_until:
+                exit_result = results[0]
+                results = results[1:]
+                if exit_result and exit_result.pos:
+                    logger.info(f"检测到退出标志图片 [{step.loop_until}]，进入下一步骤")
                     return True
 
             found_targets = []
-
-            for target in step_config['targets']:
-                position = ImageUtils.find_image(
-                    'screen.png',
-                    target['path'],
-                    target.get('threshold', 0.8)
-                )
-                if position:
-                    x_offset, y_offset = target.get('offset', (0, 0))
-                    actual_pos = (
-                        position[0] + x_offset,
-                        position[1] + y_offset
-                    )
-                    found_targets.append({
-                        "pos": actual_pos,
-                        "name": os.path.basename(target['path']),
-                        "priority": target.get('priority', 0)
-                    })
-                    if any_mode:
+            for target, result in zip(step.targets, results):
+                if result and result.pos:
+                    found_targets.append((target, result.pos))
+                    if step.any:
                         break
 
             if found_targets:
-                if any_mode:
-                    target_to_click = found_targets[0]
-                else:
-                    found_targets.sort(key=lambda x: x['priority'], reverse=True)
-                    target_to_click = found_targets[0]
+                # any 模式取第一个命中项，否则取优先级最高的（相同时取靠前的）
+                target, position = max(found_targets, key=lambda item: item[0].priority)
+                x_offset, y_offset = target.offset
+                pos = (position[0] + x_offset, position[1] + y_offset)
 
-                click_times = step_config.get('click_times', 1)
-                click_interval = step_config.get('click_interval', 0)
-
-                print(f"找到目标 [{target_to_click['name']}]，点击 {click_times} 次，间隔 {click_interval} 秒")
-                for _ in range(click_times):
-                    self.adb_utils.tap_screen(*target_to_click['pos'])
-                    time.sleep(click_interval)
+                logger.info(f"找到目标 [{target.name}]，点击 {step.click_times} 次，间隔 {step.click_interval} 秒")
+                if self.recorder:
+                    self.recorder.record_event('tap', x=pos[0], y=pos[1], times=step.click_times, target=target.name)
+                if step.click_times > 1:
+                    # 整批下发到设备端执行，返回时点击已全部完成
+                    burst = self.adb_utils.tap_burst(*pos, step.click_times, step.click_interval)
+                    logger.info(f"连续点击完成: 送达 {burst.delivered}/{burst.requested} 次，耗时 {burst.elapsed:.2f} 秒")
+                    if burst.delivered < burst.requested:
+                        logger.warning(f"有 {burst.requested - burst.delivered} 次点击未送达")
+                    # 一次都没送达（shell 调用失败或超时）时不记录，从检查点继续时仍会执行该步骤
+                    if self.on_burst and burst.delivered > 0:
+                        self.on_burst(self.kind, index)
+                else:
+                    self.adb_utils.tap_screen(*pos)
+                    time.sleep(step.click_interval)
+                self.frames.invalidate()
+                cached_results = None
+                interval = self.min_check_interval
+                last_progress = time.time()
 
-                time.sleep(step_config.get('post_delay', 1))
-                if not loop_until_target:
+                self.wait_after_tap(frame, step, self.label(step, index))
+                if not step.loop_until:
                     return True
                 else:
                     continue
             else:
-                print("未找到目标，继续等待...")
+                logger.info("未找到目标，继续等待...")
+                if self.classifier and owner and time.time() - last_progress >= self.recover_after:
+                    last_progress = time.time()
+                    match = self.classifier.classify(frame)
+                    if (match and owner not in match.owners
+                            and any(kind != 'helper' for kind, _ in match.owners)):
+                        logger.info(f"识别到其他界面 [{os.path.basename(match.path)}]，中止当前步骤")
+                        self.redirect = match
+                        return False
 
-            if time.time() - start_time > step_config.get('timeout', 60):
-                print("步骤超时")
+            if time.time() - start_time > step.timeout:
+                logger.warning("步骤超时")
                 return False
 
-            time.sleep(self.check_interval)
+            self._sleep(interval)
+        return False
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import cv2
+import numpy as np
+
+
+class TemplateStore:
+    """
+    模板预处理包：灰度模板及其金字塔按图片内容哈希保存为 .npy，启动时内存映射加载
+    图片的修改时间或大小变化时才重新解码，只重建变化的那几张
+    """
+
+    INDEX_FILE = 'index.json'
+    # 进程内按目录共享的实例：多设备与多个 AutomationCore 共用同一份索引和锁，不会并发改写 index.json
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pack_dir=os.path.join('image', '.pack')):
+        self.pack_dir = pack_dir
+        self._index = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, pack_dir=os.path.join('image', '.pack')):
+        """返回该目录在本进程内共享的 TemplateStore"""
+        key = os.path.abspath(pack_dir)
+        with cls._shared_lock:
+            store = cls._shared.get(key)
+            if store is None:
+                store = cls._shared[key] = cls(pack_dir)
+            return store
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.pack_dir, self.INDEX_FILE), 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.pack_dir, exist_ok=True)
+        path = os.path.join(self.pack_dir, self.INDEX_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _array_path(self, content_hash, level):
+        name = content_hash if level == 0 else f"{content_hash}_{level}"
+        return os.path.join(self.pack_dir, f"{name}.npy")
+
+    def is_stale(self, path):
+        """图片是否相对包内记录发生了变化（或尚未入包）"""
+        entry = self._load_index().get(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return entry is not None
+        return entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size
+
+    def load(self, path, build_pyramid):
+        """
+        加载单个模板
+        :param build_pyramid: 由模板生成下采样层列表的函数
+        :return: (template, levels)，图片无法读取时返回 None
+        """
+        with self._lock:
+            index = self._load_index()
+            if not self.is_stale(path):
+                loaded = self._load_arrays(index[path])
+                if loaded is not None:
+                    return loaded
+
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                stat = os.stat(path)
+            except OSError:
+                return None
+            content_hash = hashlib.sha1(data).hexdigest()
+            entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": content_hash}
+
+            # 内容未变（例如只是被 touch 或复制）时直接复用已有数组
+            existing = next((e for e in index.values() if e.get('hash') == content_hash), None)
+            if existing is not None:
+                entry['levels'] = existing['levels']
+                loaded = self._load_arrays(entry)
+                if loaded is not None:
+                    index[path] = entry
+                    self._save_index()
+                    return loaded
+
+            template = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if template is None:
+                return None
+            levels = build_pyramid(template)
+            os.makedirs(self.pack_dir, exist_ok=True)
+            for level, array in enumerate([template] + levels):
+                np.save(self._array_path(content_hash, level), array)
+            entry['levels'] = len(levels)
+            index[path] = entry
+            self._save_index()
+            return template, levels
+
+    def _load_arrays(self, entry):
+        try:
+            arrays = [
+                np.load(self._array_path(entry['hash'], level), mmap_mode='r')
+                for level in range(entry['levels'] + 1)
+            ]
+        except (OSError, ValueError, KeyError):
+            return None
+        return arrays[0], arrays[1:]
+
+
+class ReloadWatcher:
+    """轮询配置文件与模板图片的修改时间，用于运行中热更新"""
+
+    def __init__(self, config_path, template_paths):
+        self.config_path = config_path
+        self._mtimes = {}
+        self._config_mtime = self._mtime(config_path)
+        self.watch(template_paths)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def watch(self, template_paths):
+        """重新设定要监视的模板列表（配置热更新后模板集合可能变化）"""
+        self._mtimes = {path: self._mtimes.get(path, self._mtime(path)) for path in template_paths}
+
+    def poll(self):
+        """
+        :return: (配置是否变化, 变化的模板路径列表)
+        """
+        config_mtime = self._mtime(self.config_path)
+        config_changed = config_mtime != self._config_mtime
+        self._config_mtime = config_mtime
+
+        changed = []
+        for path, mtime in self._mtimes.items():
+            current = self._mtime(path)
+            if current != mtime:
+                self._mtimes[path] = current
+                changed.append(path)
+        return config_changed, changed
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_adb
+import frame
+import frame_provider
+import step_run
+from benchmarks.bench_flows import without_delays
+from config_loader import ConfigLoader
+from image_utils import ImageUtils
+
+
+def _absolute_paths(value):
+    """配置中的模板路径相对仓库根目录，测试不切换工作目录，统一改为绝对路径"""
+    if isinstance(value, dict):
+        return {key: _absolute_paths(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_absolute_paths(item) for item in value]
+    if isinstance(value, str) and value.endswith('.png'):
+        return os.path.join(ROOT, value)
+    return value
+
+
+def load_config(name='config.json', **overrides):
+    config = _absolute_paths(ConfigLoader.load(os.path.join(ROOT, name)))
+    config.update(overrides)
+    return config
+
+
+def compile_plan(name='config.json'):
+    plan = ConfigLoader.compile(load_config(name))
+    ImageUtils.preload_templates(plan.templates.paths)
+    return plan
+
+
+def fast_plan(max_loops=1, name='config.json'):
+    """去掉固定等待的计划，流程测试只跑处理逻辑"""
+    return without_delays(compile_plan(name)._replace(max_loops=max_loops))
+
+
+def write_config(tmp_path, name='config.json', **overrides):
+    """写出模板为绝对路径、检查点位于 tmp_path 的配置，供 AutomationCore 读取"""
+    overrides.setdefault('checkpoint_file', str(tmp_path / 'checkpoint.json'))
+    overrides.setdefault('template_pack', False)
+    path = tmp_path / name
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(load_config(name, **overrides), f, ensure_ascii=False)
+    return str(path)
+
+
+class FakeClock:
+    """替代 time 模块：sleep 只推进时间，测试结果不受机器负载影响"""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+        self._callbacks = []
+
+    def time(self):
+        return self.now
+
+    perf_counter = time
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+        due = [item for item in self._callbacks if item[0] <= self.now]
+        for item in due:
+            self._callbacks.remove(item)
+            item[1]()
+
+    def at(self, offset, callback):
+        """时间推进到 start + offset 后执行 callback"""
+        self._callbacks.append((self.now + offset, callback))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    for module in (step_run, frame, frame_provider, fake_adb):
+        monkeypatch.setattr(module, 'time', fake)
+    return fake
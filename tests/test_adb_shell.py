@@ -0,0 +1,78 @@
+import io
+import queue
+import pytest
+from adb_shell import AdbShellSession
+
+
+class FakeProc:
+    """记录 stdin 写入与 kill/wait 调用的替身进程"""
+
+    def __init__(self):
+        self.stdin = io.BytesIO()
+        self.killed = False
+        self.waited = False
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self, timeout=None):
+        self.waited = True
+        self.returncode = -9
+        return self.returncode
+
+
+def session_with_output(*lines):
+    session = AdbShellSession('adb')
+    session.proc = FakeProc()
+    session._lines = queue.Queue()
+    for line in lines:
+        session._lines.put(line)
+    return session
+
+
+def test_marker_on_its_own_line():
+    session = session_with_output('hello', 'world', 'MARK1 0')
+    assert session._wait_for('MARK1', timeout=1) == (0, 'hello\nworld')
+
+
+def test_marker_after_output_without_trailing_newline():
+    # printf abc 之后 echo 的标记接在同一行
+    session = session_with_output('first', 'abcMARK1 3')
+    assert session._wait_for('MARK1', timeout=1) == (3, 'first\nabc')
+
+
+def test_marker_of_previous_command_is_not_matched():
+    session = session_with_output('MARK1 0', 'out', 'MARK12 0')
+    assert session._wait_for('MARK12', timeout=1) == (0, 'MARK1 0\nout')
+
+
+def test_session_exit_raises_and_reaps_process():
+    session = session_with_output('partial', None)
+    proc = session.proc
+    with pytest.raises(RuntimeError):
+        session._wait_for('MARK1', timeout=1)
+    assert proc.killed and proc.waited
+    assert session.proc is None
+
+
+def test_timeout_discards_session():
+    session = session_with_output()
+    proc = session.proc
+    with pytest.raises(TimeoutError):
+        session._wait_for('MARK1', timeout=0.01)
+    assert proc.waited and session.proc is None
+
+
+def test_run_sends_command_with_numbered_marker(monkeypatch):
+    session = AdbShellSession('adb')
+    proc = FakeProc()
+    monkeypatch.setattr(session, 'is_alive', lambda: True)
+    session.proc = proc
+    session._lines = queue.Queue()
+    session._lines.put(f"{session._marker}1 0")
+    assert session.run('input tap 1 2') == (0, '')
+    assert proc.stdin.getvalue() == f"input tap 1 2; echo {session._marker}1 $?\n".encode('utf-8')
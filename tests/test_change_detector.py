@@ -0,0 +1,67 @@
+import os
+import cv2
+import numpy as np
+from conftest import ROOT, compile_plan
+from fake_adb import FakeAdbUtils, FakeScreen
+from frame import ChangeDetector, Frame
+from step_run import StepRunner
+
+TEMPLATE = os.path.join(ROOT, 'image', 'makeok.png')
+
+
+def background():
+    rng = np.random.default_rng(0)
+    return cv2.GaussianBlur(rng.integers(0, 256, (720, 1280), dtype=np.uint8), (9, 9), 0)
+
+
+def with_popup(image, alpha=1.0):
+    template = cv2.imread(TEMPLATE, cv2.IMREAD_GRAYSCALE)
+    h, w = template.shape
+    result = image.astype(np.float32)
+    result[300:300 + h, 600:600 + w] = result[300:300 + h, 600:600 + w] * (1 - alpha) + template * alpha
+    return result.astype(np.uint8)
+
+
+def test_small_popup_is_a_change():
+    detector = ChangeDetector()
+    image = background()
+    assert detector.changed(Frame(image))
+    assert not detector.changed(Frame(image.copy()))
+    assert detector.changed(Frame(with_popup(image)))
+
+
+def test_gradual_fade_in_is_detected_against_reference():
+    detector = ChangeDetector(max_skips=0)
+    image = background()
+    detector.changed(Frame(image))
+    changes = [detector.changed(Frame(with_popup(image, alpha))) for alpha in np.linspace(0.05, 1, 20)]
+    assert any(changes)
+
+
+def test_forced_rematch_after_max_skips():
+    detector = ChangeDetector(max_skips=3)
+    image = background()
+    detector.changed(Frame(image))
+    assert [detector.changed(Frame(image)) for _ in range(3)] == [False, False, True]
+
+
+def test_step_finds_popup_that_appears_on_static_screen(clock):
+    plan = compile_plan()
+    # makeok.png 属于全局监听的子循环
+    step = next(s for s in plan.sub.steps if s.targets[0].path.endswith('makeok.png'))
+    step = step._replace(timeout=5, post_delay=0, click_interval=0, settle=None)
+
+    image = background()
+    device = FakeAdbUtils({
+        'idle': FakeScreen('idle', image),
+        'popup': FakeScreen('popup', with_popup(image)),
+    }, 'idle')
+    runner = StepRunner(plan.sub, device, check_interval=0.2, min_check_interval=0.05)
+
+    start = clock.time()
+    clock.at(0.5, lambda: setattr(device, 'current', 'popup'))
+    assert runner.run_step(step, 0)
+    # 弹窗出现后的下一次轮询（间隔不超过 check_interval）就应找到，而不是等到强制重新匹配
+    assert clock.time() - start <= 0.5 + 0.2
+    assert device.taps and device.taps[0][3] == 'popup'
+
@@ -0,0 +1,104 @@
+import json
+import os
+import pytest
+from adb_utils import BurstResult
+from automation_core import AutomationCore
+from fake_adb import FakeAdbUtils
+from step_run import StepRunner
+from conftest import fast_plan, write_config
+
+# config.json 主循环第 14 步 plus.png 连续点击 50 次
+BURST_STEP = 14
+
+
+def make_core(tmp_path, plan, device, **overrides):
+    core = AutomationCore(write_config(tmp_path, **overrides), 'adb', '127.0.0.1', 0, adb_utils=device)
+    core.plan = plan
+    return core
+
+
+def crash_after_burst(core, times=1):
+    """连续点击送达并记录检查点后抛出异常，模拟此时进程出错"""
+    done = core._burst_done
+    crashes = []
+
+    def burst_done(kind, index):
+        done(kind, index)
+        if len(crashes) < times:
+            crashes.append(index)
+            raise RuntimeError("模拟出错")
+    core._burst_done = burst_done
+    return crashes
+
+
+def burst_taps(device):
+    return [tap for tap in device.taps if tap[3] == f"main_{BURST_STEP}"]
+
+
+@pytest.fixture
+def plan():
+    plan = fast_plan()
+    assert plan.main.steps[BURST_STEP].click_times > 1
+    return plan
+
+
+def test_crash_after_burst_resumes_at_next_step(tmp_path, plan):
+    device = FakeAdbUtils.from_plan(plan)
+    core = make_core(tmp_path, plan, device, max_restarts=0)
+    crash_after_burst(core)
+    core.run()
+    assert core.status == "failed"
+    with open(core.checkpoint.path, encoding='utf-8') as f:
+        state = json.load(f)
+    assert (state['loop'], state['step'], state['burst_delivered']) == ('main', BURST_STEP, True)
+
+    resumed_device = FakeAdbUtils.from_plan(plan)
+    resumed_device.current = f"main_{BURST_STEP + 1}"
+    resumed = make_core(tmp_path, plan, resumed_device)
+    resumed.run()
+    assert resumed.status == "finished"
+    assert not burst_taps(resumed_device)
+    assert resumed.steps_done == len(plan.main.steps)
+    assert not os.path.exists(resumed.checkpoint.path)
+
+
+def test_restart_in_process_does_not_repeat_burst(tmp_path, plan):
+    device = FakeAdbUtils.from_plan(plan)
+    core = make_core(tmp_path, plan, device)
+    core.watchdog = None
+    crash_after_burst(core)
+    core.run()
+    assert core.status == "finished" and core.restarts == 1
+    assert len(burst_taps(device)) == 1
+    assert core.steps_done == len(plan.main.steps)
+
+
+def test_stop_clears_checkpoint(tmp_path, plan):
+    device = FakeAdbUtils.from_plan(plan)
+    core = make_core(tmp_path, plan, device)
+    tap = device.tap_screen
+
+    def tap_then_stop(x, y):
+        tap(x, y)
+        if len(device.taps) == 3:
+            core.running = False
+    device.tap_screen = tap_then_stop
+    core.run()
+    assert core.status == "stopped"
+    assert not os.path.exists(core.checkpoint.path)
+
+
+@pytest.mark.parametrize('delivered, marked', [(0, False), (1, True), (50, True)])
+def test_burst_marked_only_when_taps_delivered(plan, delivered, marked):
+    device = FakeAdbUtils.from_plan(plan)
+    device.current = f"main_{BURST_STEP}"
+    tap_burst = device.tap_burst
+
+    def partial_burst(x, y, times, interval=0):
+        tap_burst(x, y, times, interval)
+        return BurstResult(delivered, times, 0.0)
+    device.tap_burst = partial_burst
+    calls = []
+    runner = StepRunner(plan.main, device, on_burst=lambda kind, index: calls.append((kind, index)))
+    assert runner.run_step(plan.main.steps[BURST_STEP], BURST_STEP)
+    assert calls == ([('main', BURST_STEP)] if marked else [])
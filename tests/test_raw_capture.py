@@ -0,0 +1,71 @@
+import struct
+import cv2
+import numpy as np
+from adb_utils import AdbUtils
+from frame import Frame
+
+WIDTH, HEIGHT = 20, 10
+PNG = cv2.imencode('.png', np.zeros((HEIGHT, WIDTH, 3), np.uint8))[1].tobytes()
+REJECT_LIMIT = AdbUtils('adb').raw_reject_limit
+
+
+def raw_frame(header_size=16, pixel_format=1, width=WIDTH, height=HEIGHT, value=128):
+    header = struct.pack('<III', width, height, pixel_format) + b'\0' * (header_size - 12)
+    return header + bytes([value]) * (width * height * 4)
+
+
+def device(mode, raw_reads):
+    """raw 截图依次返回 raw_reads 中的数据，PNG 截图总是成功"""
+    adb = AdbUtils('adb', capture_mode=mode)
+    reads = iter(raw_reads)
+    adb._screencap = lambda raw=False: next(reads) if raw else PNG
+    return adb
+
+
+def test_parse_raw_header_for_both_header_sizes():
+    assert Frame.parse_raw_header(raw_frame(12)) == (WIDTH, HEIGHT, 1, 12)
+    assert Frame.parse_raw_header(raw_frame(16)) == (WIDTH, HEIGHT, 1, 16)
+
+
+def test_parse_raw_header_rejects_bad_data():
+    assert Frame.parse_raw_header(b'') is None
+    assert Frame.parse_raw_header(raw_frame(pixel_format=99)) is None
+    assert Frame.parse_raw_header(raw_frame(width=0)) is None
+    # 截断的数据长度与头部声明的尺寸不符
+    assert Frame.parse_raw_header(raw_frame()[:-1]) is None
+
+
+def test_from_raw_decodes_grayscale():
+    frame = Frame.from_raw(raw_frame(value=200))
+    assert frame.image.shape == (HEIGHT, WIDTH)
+    assert int(frame.image[0, 0]) == 200
+
+
+def test_empty_raw_reads_fail_without_switching_to_png():
+    adb = device('raw', [b'', b'', b'', b'', raw_frame()])
+    results = [adb.take_screenshot() for _ in range(5)]
+    assert [frame is not None for frame in results] == [False, False, False, False, True]
+    assert adb.capture_mode == 'raw'
+
+
+def test_occasional_bad_header_falls_back_for_one_capture_only():
+    adb = device('raw', [b'junk', b'junk', raw_frame(), b'junk'])
+    assert all(adb.take_screenshot() is not None for _ in range(4))
+    assert adb.capture_mode == 'raw'
+
+
+def test_repeated_bad_headers_switch_to_png():
+    adb = device('raw', [b'junk'] * REJECT_LIMIT)
+    for _ in range(REJECT_LIMIT):
+        assert adb.take_screenshot() is not None
+    assert adb.capture_mode == 'png'
+
+
+def test_stream_probe_ignores_empty_reads():
+    adb = device('stream', [b''] * 5 + [b'junk'] * REJECT_LIMIT)
+    for _ in range(5):
+        assert adb.take_screenshot() is None
+    assert adb.capture_mode == 'stream'
+    for _ in range(REJECT_LIMIT):
+        adb.take_screenshot()
+    assert adb.capture_mode == 'png'
@@ -0,0 +1,83 @@
+import types
+import pytest
+from automation_core import AutomationCore
+from fake_adb import FakeAdbUtils
+from screen_classifier import ScreenClassifier, ScreenMatch
+from step_run import StepRunner
+from conftest import fast_plan, write_config
+
+# config.json 主循环：14 plus.png 连续点击 50 次，18 plus.png 连续点击 10 次，15/19 buy.png，16/20 shoptuzuku.png
+
+
+@pytest.fixture
+def plan():
+    return fast_plan()
+
+
+@pytest.fixture
+def core(tmp_path, plan):
+    core = AutomationCore(
+        write_config(tmp_path, screen_recovery=True), 'adb', '127.0.0.1', 0,
+        adb_utils=FakeAdbUtils.from_plan(plan)
+    )
+    core.plan = plan
+    return core
+
+
+def redirected(*owners):
+    return types.SimpleNamespace(redirect=ScreenMatch('screen.png', 0.9, list(owners)))
+
+
+def test_screen_recovery_is_opt_in(tmp_path, plan):
+    core = AutomationCore(write_config(tmp_path), 'adb', '127.0.0.1', 0, adb_utils=FakeAdbUtils.from_plan(plan))
+    assert core.classifier is None
+    assert core.recover_after >= 30
+
+
+def test_forward_redirect_jumps(core, plan):
+    length = len(plan.main.steps)
+    assert core._recover(redirected(('main', 16)), 'main', 15, length) == ('main', 16)
+    assert core.recoveries == 1
+
+
+def test_backward_redirect_without_burst_jumps(core, plan):
+    length = len(plan.main.steps)
+    assert core._recover(redirected(('main', 12)), 'main', 13, length) == ('main', 12)
+
+
+@pytest.mark.parametrize('current, owner', [
+    (15, 14),  # buy.png 漏识别后看到 plus.png：回退会重复 50 次点击
+    (19, 15),  # 回退到 15 会经过 18 的 10 次连续点击
+    (2, 14),   # 跨过循环开头回退
+])
+def test_backward_redirect_over_burst_retries_current_step(core, plan, current, owner):
+    length = len(plan.main.steps)
+    assert core._recover(redirected(('main', owner)), 'main', current, length) == ('main', current)
+    assert core.recoveries == 0
+
+
+def test_backward_jump_over_burst_after_timeout_is_a_timeout(core, plan, monkeypatch):
+    match = ScreenMatch('plus.png', 0.9, [('main', 14), ('main', 18)])
+    monkeypatch.setattr(core.classifier, 'classify', lambda frame: match)
+    monkeypatch.setattr(core.frames, 'get', lambda max_age=None: object())
+    runner = types.SimpleNamespace(redirect=None)
+    assert core._recover(runner, 'main', 15, len(plan.main.steps)) is None
+
+
+def test_resolve_exit_and_monitor_take_priority():
+    assert ScreenClassifier.resolve(ScreenMatch('p', 1, [('exit', None), ('main', 3)]), 'main', 1, 10) == ('exit', None)
+    assert ScreenClassifier.resolve(ScreenMatch('p', 1, [('monitor', None)]), 'main', 1, 10) == ('monitor', None)
+    assert ScreenClassifier.resolve(ScreenMatch('p', 1, [('sub_exit', None)]), 'sub', 1, 10) == ('main', 0)
+    assert ScreenClassifier.resolve(ScreenMatch('p', 1, [('main', 1), ('main', 5)]), 'main', 1, 10) is None
+
+
+def test_step_redirects_when_screen_belongs_to_another_step(clock, plan):
+    device = FakeAdbUtils.from_plan(plan)
+    # 执行第 15 步（buy.png）时画面已经是第 16 步
+    device.current = 'main_16'
+    runner = StepRunner(
+        plan.main, device, check_interval=0.5, classifier=ScreenClassifier(plan.screen_index), recover_after=1
+    )
+    assert not runner.run_step(plan.main.steps[15], 15)
+    assert runner.redirect is not None and ('main', 16) in runner.redirect.owners
+    assert not device.taps
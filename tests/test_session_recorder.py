@@ -0,0 +1,93 @@
+import glob
+import os
+import threading
+import numpy as np
+import pytest
+from frame import Frame
+from session_recorder import SEGMENT_PATTERN, SessionReader, SessionRecorder
+
+
+def noise_frame(seq, size=64):
+    # 随机噪声几乎无法压缩，每帧 PNG 约 size * size 字节
+    image = np.random.default_rng(seq).integers(0, 256, (size, size), dtype=np.uint8)
+    return Frame(image, timestamp=float(seq))
+
+
+@pytest.fixture
+def blocked_writer(monkeypatch):
+    """写入线程在 release 之前阻塞，用于把队列填满"""
+    release = threading.Event()
+    write = SessionRecorder._write
+
+    def slow_write(self, kind, meta, image):
+        release.wait(10)
+        write(self, kind, meta, image)
+    monkeypatch.setattr(SessionRecorder, '_write', slow_write)
+    return release
+
+
+def test_oldest_segments_are_evicted(tmp_path):
+    recorder = SessionRecorder(str(tmp_path), max_bytes=40 * 1024, segment_bytes=10 * 1024)
+    for seq in range(1, 41):
+        frame = noise_frame(seq)
+        frame.seq = seq
+        recorder.record_frame(frame)
+    recorder.close()
+    assert recorder.written == 40 and recorder.evicted > 0
+    segments = glob.glob(os.path.join(str(tmp_path), SEGMENT_PATTERN))
+    # 当前分段不删除，总大小最多超出一个分段
+    assert sum(os.path.getsize(p) for p in segments) <= 40 * 1024 + 10 * 1024
+    seqs = [meta['seq'] for meta, _ in SessionReader(str(tmp_path)).frames()]
+    assert seqs and seqs[-1] == 40 and seqs == sorted(seqs) and seqs[0] > 1
+
+
+def test_reference_to_previous_segment_is_rewritten_as_full_frame(tmp_path):
+    # 静止画面只记引用；引用恰好落入新分段时，旧分段删除后仍需能还原
+    recorder = SessionRecorder(str(tmp_path), max_bytes=1, segment_bytes=8 * 1024)
+    for seq in range(1, 201):
+        frame = noise_frame(0)
+        frame.seq = seq
+        recorder.record_frame(frame)
+    recorder.close()
+    assert recorder.evicted > 0
+    records = [meta for meta, _ in SessionReader(str(tmp_path)).records() if meta['kind'] == 'frame']
+    frames = [meta['seq'] for meta, _ in SessionReader(str(tmp_path)).frames()]
+    assert frames == [meta['seq'] for meta in records] and frames[-1] == 200
+
+
+def test_identical_frames_are_stored_as_references(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    for seq in (1, 2, 3):
+        frame = noise_frame(0)
+        frame.seq = seq
+        recorder.record_frame(frame)
+    recorder.close()
+    records = list(SessionReader(str(tmp_path)).records())
+    assert [bool(payload) for _, payload in records] == [True, False, False]
+    frames = list(SessionReader(str(tmp_path)).frames())
+    assert len(frames) == 3 and all(np.array_equal(image, frames[0][1]) for _, image in frames)
+
+
+def test_close_waits_for_full_queue_instead_of_dropping_sentinel(tmp_path, blocked_writer):
+    recorder = SessionRecorder(str(tmp_path), queue_size=4)
+    for index in range(10):
+        recorder.record_event('step', index=index)
+    # 队列已满：写入线程最多取走 1 条，其余超出队列长度的记录丢弃
+    assert recorder.dropped >= 5
+    threading.Timer(0.05, blocked_writer.set).start()
+    recorder.close(timeout=10)
+    assert not recorder._thread.is_alive()
+    assert recorder.written == 10 - recorder.dropped
+
+
+def test_queue_is_bounded_by_frame_bytes(tmp_path, blocked_writer):
+    frame_bytes = 64 * 64
+    recorder = SessionRecorder(str(tmp_path), queue_size=64, queue_bytes=3 * frame_bytes)
+    for seq in range(1, 11):
+        frame = noise_frame(seq)
+        frame.seq = seq
+        recorder.record_frame(frame)
+    assert recorder.dropped == 7
+    blocked_writer.set()
+    recorder.close()
+    assert recorder.written == 3 and recorder._queued_bytes == 0
@@ -0,0 +1,64 @@
+import types
+import step_run
+from fake_adb import FakeAdbUtils, FakeScreen
+from frame import Frame
+from metrics import Metrics
+from step_run import StepRunner
+from conftest import compile_plan
+from test_change_detector import background, with_popup
+
+
+def settle_runner(image, interrupts=None):
+    plan = compile_plan()
+    device = FakeAdbUtils({
+        'idle': FakeScreen('idle', image),
+        'popup': FakeScreen('popup', with_popup(image)),
+    }, 'idle')
+    return StepRunner(plan.sub, device, min_check_interval=0.05, interrupts=interrupts), device
+
+
+def test_settle_waits_for_small_popup(clock):
+    image = background()
+    runner, device = settle_runner(image)
+    clock.at(0.3, lambda: setattr(device, 'current', 'popup'))
+    elapsed, settled = runner.wait_until_settled(Frame(image), 0.2, 3, quiet=1)
+    # 0.3 秒出现变化，再稳定 0.2 秒
+    assert settled and 0.5 <= elapsed < 0.7
+
+
+def test_settle_returns_after_post_delay_without_change(clock):
+    image = background()
+    runner, _ = settle_runner(image)
+    elapsed, settled = runner.wait_until_settled(Frame(image), 0.2, 3, quiet=0.5)
+    assert settled and 0.5 <= elapsed < 0.6
+
+
+class CutShort:
+    """等待 seconds 秒的 post_delay 时只过了 after 秒就被中断"""
+
+    def __init__(self, clock, after):
+        self.clock = clock
+        self.event = types.SimpleNamespace(wait=self.wait)
+        self.after = after
+
+    def wait(self, seconds):
+        self.clock.sleep(min(seconds, self.after))
+        return seconds > self.after
+
+    def begin_wait(self, seconds):
+        pass
+
+    def end_wait(self):
+        pass
+
+
+def test_interrupted_post_delay_records_time_actually_waited(clock, monkeypatch):
+    recorded = Metrics()
+    monkeypatch.setattr(step_run, 'metrics', recorded)
+    image = background()
+    runner, _ = settle_runner(image, interrupts=CutShort(clock, 0.2))
+    node = types.SimpleNamespace(settle=None, post_delay=1.0)
+    runner.wait_after_tap(Frame(image), node, 'main[0]')
+    (key, series), = recorded.series.items()
+    assert key[0] == 'wait_seconds'
+    assert abs(series.total - 0.2) < 1e-9
@@ -0,0 +1,268 @@
+"""
+阈值与搜索区域调优：在录制的画面上计算 模板 × 帧 的完整分数矩阵，为每个模板给出建议阈值、搜索区域与混淆报告
+
+    python tune_thresholds.py config.json recordings/<会话目录> [更多画面目录...] [--write]
+
+画面来源可以是 PNG 画面目录，也可以是 SessionRecorder 录制的会话目录
+--write 把建议写回配置文件（同一模板的所有引用处都会更新）
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import yaml
+from config_loader import ConfigLoader
+from frame import Frame
+from image_utils import ImageUtils
+from log_utils import setup_logging
+from session_recorder import SessionReader
+
+logger = logging.getLogger(__name__)
+
+PRESENT_SCORE = 0.7   # 分数达到该值才可能是“出现”，用于寻找分界
+MIN_GAP = 0.1         # 出现与未出现之间的分数差小于该值时认为没有可靠分界
+NEAR_MISS = 0.05      # 低于阈值不到该值的帧计为险些命中，容易引起重试
+
+
+def load_corpus(paths, resolution=None):
+    """
+    加载画面：PNG 目录或录制的会话目录，会话中相同的连续帧只取一张
+    :return: [(名称, 灰度图), ...]
+    """
+    frames = []
+    for path in paths:
+        if glob.glob(os.path.join(path, 'seg_*.bin')):
+            screens, _ = SessionReader(path).replay_table()
+            items = [(f"{os.path.basename(path)}/{name}", image) for name, image in screens]
+        else:
+            items = []
+            for image_path in sorted(glob.glob(os.path.join(path, '*.png'))):
+                image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+                if image is not None:
+                    items.append((image_path, image))
+        for name, image in items:
+            if resolution:
+                frame = Frame(image)
+                frame.resize_to(resolution)
+                image = frame.image
+            frames.append((name, image))
+    return frames
+
+
+def score_matrix(templates, frames, workers=None):
+    """
+    全帧匹配得到分数矩阵
+    :return: (scores[模板, 帧], boxes[模板, 帧, 4])，boxes 为最佳位置的 (x, y, w, h)
+    """
+    scores = np.zeros((len(templates), len(frames)), np.float32)
+    boxes = np.zeros((len(templates), len(frames), 4), np.int32)
+
+    def run(frame_index):
+        image = frames[frame_index][1]
+        for t, path in enumerate(templates):
+            template = ImageUtils._template_cache[path]
+            h, w = template.shape
+            if image.shape[0] < h or image.shape[1] < w:
+                continue
+            result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            scores[t, frame_index] = max_val
+            boxes[t, frame_index] = (max_loc[0], max_loc[1], w, h)
+
+    # matchTemplate 释放 GIL，按帧并行
+    with ThreadPoolExecutor(max_workers=workers or ImageUtils._max_workers) as executor:
+        list(executor.map(run, range(len(frames))))
+    return scores, boxes
+
+
+def propose_threshold(scores):
+    """
+    在排序后的分数中找出“出现”一侧最大的分数间隔，取间隔中点作为阈值
+    :return: (阈值, 出现的帧掩码, 说明)；模板从未出现或没有可靠分界时阈值为 None
+    """
+    ordered = np.sort(scores)
+    if ordered.size == 0 or ordered[-1] < PRESENT_SCORE:
+        return None, np.zeros(scores.shape, bool), "未出现"
+    gaps = np.diff(ordered)
+    # 只考虑上侧达到 PRESENT_SCORE 的间隔
+    gaps[ordered[1:] < PRESENT_SCORE] = 0
+    if gaps.size == 0 or gaps.max() < MIN_GAP:
+        if ordered[0] >= PRESENT_SCORE:
+            # 所有帧都出现了该模板：没有反例，只能在最低分之下留出余量
+            threshold = round(float(ordered[0]) - MIN_GAP, 2)
+            return threshold, scores >= threshold, "无反例"
+        return None, scores >= PRESENT_SCORE, "无明显分界"
+    i = int(np.argmax(gaps))
+    threshold = round(float(ordered[i] + ordered[i + 1]) / 2, 2)
+    return threshold, scores >= threshold, f"分界 {ordered[i]:.2f} / {ordered[i + 1]:.2f}"
+
+
+def propose_region(boxes, present, shape, padding):
+    """出现位置的外接矩形外扩 padding，限制在画面内"""
+    if not present.any():
+        return None
+    selected = boxes[present]
+    x0 = max(0, int(selected[:, 0].min()) - padding)
+    y0 = max(0, int(selected[:, 1].min()) - padding)
+    x1 = min(shape[1], int((selected[:, 0] + selected[:, 2]).max()) + padding)
+    y1 = min(shape[0], int((selected[:, 1] + selected[:, 3]).max()) + padding)
+    return [x0, y0, x1 - x0, y1 - y0]
+
+
+def current_thresholds(plan):
+    """各模板在配置中使用的阈值（同一模板多处引用时取最小值，与最宽松的用法比较）"""
+    thresholds = {}
+    for entry in plan.screen_index:
+        thresholds[entry.path] = min(thresholds.get(entry.path, 1.0), entry.threshold)
+    return thresholds
+
+
+def analyze(plan, frames, scores, boxes, padding):
+    templates = plan.templates.paths
+    thresholds = current_thresholds(plan)
+    owners = {}
+    for entry in plan.screen_index:
+        owners.setdefault(entry.path, set()).add((entry.kind, entry.index))
+
+    shape = frames[0][1].shape
+    proposals = []
+    present_masks = []
+    for t, path in enumerate(templates):
+        threshold, present, note = propose_threshold(scores[t])
+        current = thresholds.get(path, 0.8)
+        row = scores[t]
+        proposals.append({
+            "template": path,
+            "current": current,
+            "threshold": threshold,
+            "region": propose_region(boxes[t], present, shape, padding) if threshold is not None else None,
+            "present": int(present.sum()),
+            "note": note,
+            # 以建议阈值划分出的“出现”为准，检查当前阈值的漏检与误检
+            "missed": int((present & (row < current)).sum()),
+            "false_hits": int((~present & (row >= current)).sum()),
+            "near_miss": int(((row < current) & (row >= current - NEAR_MISS)).sum()),
+        })
+        present_masks.append(present)
+
+    # 混淆：属于不同界面的两个模板在同一帧上同时出现
+    confusion = []
+    for a in range(len(templates)):
+        for b in range(a + 1, len(templates)):
+            if owners.get(templates[a], set()) & owners.get(templates[b], set()):
+                continue
+            both = int((present_masks[a] & present_masks[b]).sum())
+            if both:
+                confusion.append((templates[a], templates[b], both))
+    confusion.sort(key=lambda item: -item[2])
+    return proposals, confusion
+
+
+def print_report(proposals, confusion, frame_count):
+    print(f"画面 {frame_count} 帧")
+    print(f"{'模板':<24}{'当前':>6}{'建议':>6}{'出现':>6}{'漏检':>6}{'误检':>6}{'险些':>6}  区域 / 说明")
+    for p in proposals:
+        suggested = f"{p['threshold']:.2f}" if p['threshold'] is not None else "-"
+        print(
+            f"{os.path.basename(p['template']):<24}{p['current']:>6.2f}{suggested:>6}{p['present']:>6}"
+            f"{p['missed']:>6}{p['false_hits']:>6}{p['near_miss']:>6}  {p['region'] or '-'} {p['note']}"
+        )
+    if confusion:
+        print("\n不同界面的模板同时出现（可能互相混淆）:")
+        for a, b, count in confusion[:20]:
+            print(f"  {os.path.basename(a)} + {os.path.basename(b)}: {count} 帧")
+
+
+def iter_template_slots(config):
+    """
+    遍历原始配置中所有引用模板的位置
+    :return: 生成器 (所在字典, 路径键, 阈值键, 区域键)
+    """
+    def steps(step_list):
+        for step in step_list:
+            for target in step.get('targets', []):
+                yield target, 'path', 'threshold', 'region'
+            if step.get('loop_until_target'):
+                yield step, 'loop_until_target', 'loop_until_threshold', 'loop_until_region'
+
+    yield from steps(config.get('steps', []))
+    for helper in config.get('helper_steps', {}).values():
+        yield helper, 'trigger_image', 'threshold', 'region'
+    exit_condition = config.get('loop', {}).get('exit_condition')
+    if exit_condition:
+        yield exit_condition, 'target', 'threshold', 'region'
+    monitor = config.get('global_monitor')
+    if monitor:
+        yield monitor, 'trigger_image', 'threshold', 'region'
+        target_loop = monitor.get('target_loop', {})
+        yield from steps(target_loop.get('steps', []))
+        if target_loop.get('exit_condition'):
+            yield target_loop['exit_condition'], 'target', 'threshold', 'region'
+
+
+def write_back(config_path, proposals, base_dir="image"):
+    """把建议阈值与区域写回配置文件，返回更新的位置数"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        is_yaml = config_path.lower().endswith(('.yaml', '.yml'))
+        config = yaml.safe_load(f) if is_yaml else json.load(f)
+
+    by_path = {p['template']: p for p in proposals if p['threshold'] is not None}
+    updated = 0
+    for slot, path_key, threshold_key, region_key in iter_template_slots(config):
+        path = slot.get(path_key)
+        if not path:
+            continue
+        # 与 ConfigLoader 相同的默认目录规则
+        if not os.path.isabs(path) and not path.startswith(base_dir):
+            path = os.path.join(base_dir, path)
+        proposal = by_path.get(path)
+        if proposal is None:
+            continue
+        slot[threshold_key] = proposal['threshold']
+        if proposal['region']:
+            slot[region_key] = proposal['region']
+        updated += 1
+
+    with open(config_path, 'w', encoding='utf-8') as f:
+        if is_yaml:
+            yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+        else:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="根据录制画面调优阈值与搜索区域")
+    parser.add_argument('config', help="配置文件路径")
+    parser.add_argument('corpus', nargs='+', help="PNG 画面目录或录制的会话目录")
+    parser.add_argument('--padding', type=int, default=20, help="建议区域在出现位置外扩的像素")
+    parser.add_argument('--workers', type=int, default=None, help="匹配线程数")
+    parser.add_argument('--write', action='store_true', help="把建议写回配置文件")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    config = ConfigLoader.load(args.config)
+    ConfigLoader.validate(config)
+    plan = ConfigLoader.compile(config)
+    frames = load_corpus(args.corpus, config.get('reference_resolution'))
+    if not frames:
+        logger.error("没有可用的画面")
+        return 1
+
+    ImageUtils.preload_templates(plan.templates.paths)
+    scores, boxes = score_matrix(plan.templates.paths, frames, args.workers)
+    proposals, confusion = analyze(plan, frames, scores, boxes, args.padding)
+    print_report(proposals, confusion, len(frames))
+
+    if args.write:
+        updated = write_back(args.config, proposals)
+        logger.info(f"已写回 {args.config}，更新 {updated} 处")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())